@@ -0,0 +1,215 @@
+"""
+Per-user rolling health aggregates, maintained as days are synced.
+
+Every synced day contributes one value per series (resting HR, sleep,
+stress, ...). `RollingAggregates` keeps the newest days in a ring buffer
+with running sums and counts per trailing window (7 and 28 days by
+default, ending at the newest synced day), so adding a day is O(1) and
+reading the aggregates costs nothing. The per-day values are stored as a
+JSON snapshot next to the user's tokens; syncs merge the days they fetched
+into it.
+"""
+import json
+import os
+import threading
+from datetime import date
+from pathlib import Path
+
+from atomic_json import atomic_write_json
+
+AGGREGATES_FILE = "aggregates.json"
+
+# Trailing windows in days, e.g. "7,28"
+AGGREGATE_WINDOWS = tuple(
+    int(days) for days in os.environ.get("GARMIN_AGGREGATE_WINDOWS", "7,28").split(",") if days.strip()
+)
+
+# Nightly sleep the sleep debt is measured against
+SLEEP_TARGET_HOURS = float(os.environ.get("GARMIN_SLEEP_TARGET_HOURS", "8"))
+
+MEAN = "mean"
+SUM = "sum"
+
+_lock = threading.Lock()
+
+
+def _number(value):
+    """Non-negative numbers as float; Garmin uses negative values for "no data"."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        return None
+    return float(value)
+
+
+def _field(name: str):
+    return lambda record: _number(record.get(name))
+
+
+def _sleep_hours(record: dict):
+    seconds = _number(record.get("sleepTimeSeconds"))
+    return seconds / 3600 if seconds else None
+
+
+def _sleep_debt(record: dict):
+    hours = _sleep_hours(record)
+    return max(0.0, SLEEP_TARGET_HOURS - hours) if hours is not None else None
+
+
+def _intensity_minutes(record: dict):
+    # Vigorous minutes count double, as in Garmin's weekly intensity goal
+    moderate = _number(record.get("moderateIntensityMinutes"))
+    vigorous = _number(record.get("vigorousIntensityMinutes"))
+    if moderate is None and vigorous is None:
+        return None
+    return (moderate or 0) + 2 * (vigorous or 0)
+
+
+# Series name -> (sync_all metric it is read from, value of one day, reduction)
+SERIES = {
+    "restingHeartRate": ("activity", _field("restingHeartRate"), MEAN),
+    "sleepHours": ("sleep", _sleep_hours, MEAN),
+    "sleepDebtHours": ("sleep", _sleep_debt, SUM),
+    "sleepScore": ("sleep", _field("sleepScore"), MEAN),
+    "stressLevel": ("stress", _field("overallStressLevel"), MEAN),
+    "bodyBatteryCharged": ("activity", _field("bodyBatteryChargedValue"), MEAN),
+    "bodyBatteryDrained": ("activity", _field("bodyBatteryDrainedValue"), MEAN),
+    "steps": ("activity", _field("totalSteps"), MEAN),
+    "intensityMinutes": ("activity", _intensity_minutes, SUM),
+}
+
+
+def day_values(day_data: dict) -> dict:
+    """{series: value} of one sync_all day, leaving out metrics that failed or weren't fetched."""
+    skipped = day_data.get("upToDate", ())
+    values = {}
+    for name, (metric, extract, _) in SERIES.items():
+        if metric in skipped or f"{metric}Error" in day_data:
+            continue
+        record = day_data.get(metric)
+        values[name] = extract(record) if isinstance(record, dict) else None
+    return values
+
+
+class RollingAggregates:
+    """Running sums and counts of daily series over trailing windows."""
+
+    def __init__(self, windows: tuple = AGGREGATE_WINDOWS):
+        self.windows = tuple(sorted(set(windows))) or (7,)
+        self.size = self.windows[-1]
+        self.latest = None  # ordinal of the newest day added
+        self._reset()
+
+    def _reset(self):
+        self.slots = [None] * self.size  # ordinal of the day each slot holds
+        self.values = {name: [None] * self.size for name in SERIES}
+        self.sums = {name: [0.0] * len(self.windows) for name in SERIES}
+        self.counts = {name: [0] * len(self.windows) for name in SERIES}
+
+    def _account(self, name: str, ordinal: int, value: float, sign: int):
+        """Add (sign 1) or remove (-1) one value in every window containing `ordinal`."""
+        for i, window in enumerate(self.windows):
+            if ordinal > self.latest - window:
+                self.sums[name][i] += sign * value
+                self.counts[name][i] += sign
+
+    def _advance(self, ordinal: int):
+        """Make `ordinal` the newest day, dropping days that leave each window."""
+        if self.latest is None or ordinal - self.latest >= self.size:
+            self._reset()
+            self.latest = ordinal
+            return
+        for day in range(self.latest + 1, ordinal + 1):
+            for i, window in enumerate(self.windows):
+                leaving = day - window
+                slot = leaving % self.size
+                if self.slots[slot] != leaving:
+                    continue
+                for name, values in self.values.items():
+                    if values[slot] is not None:
+                        self.sums[name][i] -= values[slot]
+                        self.counts[name][i] -= 1
+            # This day's slot held a day that has now left every window
+            slot = day % self.size
+            self.slots[slot] = None
+            for values in self.values.values():
+                values[slot] = None
+        self.latest = ordinal
+
+    def add(self, day: str, values: dict) -> bool:
+        """Set one day's series values (replacing earlier ones); False if it is too old."""
+        ordinal = date.fromisoformat(day).toordinal()
+        if self.latest is None or ordinal > self.latest:
+            self._advance(ordinal)
+        elif ordinal <= self.latest - self.size:
+            return False
+
+        slot = ordinal % self.size
+        self.slots[slot] = ordinal
+        for name, value in values.items():
+            if name not in self.values:
+                continue
+            old = self.values[name][slot]
+            if old is not None:
+                self._account(name, ordinal, old, -1)
+            if value is not None:
+                self._account(name, ordinal, value, 1)
+            self.values[name][slot] = value
+        return True
+
+    def summary(self) -> dict:
+        """Aggregates per series and window, with the number of days that had data."""
+        metrics = {}
+        for name, (_, _, reduction) in SERIES.items():
+            windows = {}
+            for i, window in enumerate(self.windows):
+                total, days = self.sums[name][i], self.counts[name][i]
+                value = None
+                if days:
+                    value = round(total / days if reduction == MEAN else total, 2)
+                windows[f"{window}d"] = {"value": value, "days": days}
+            metrics[name] = {"reduction": reduction, "windows": windows}
+        return {
+            "asOf": date.fromordinal(self.latest).isoformat() if self.latest is not None else None,
+            "windows": list(self.windows),
+            "metrics": metrics,
+        }
+
+    def snapshot(self) -> dict:
+        """Per-day values of the days still inside the longest window."""
+        days = {}
+        for slot, ordinal in enumerate(self.slots):
+            if ordinal is not None:
+                days[date.fromordinal(ordinal).isoformat()] = {
+                    name: values[slot] for name, values in self.values.items()
+                }
+        return {"days": dict(sorted(days.items()))}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict, windows: tuple = AGGREGATE_WINDOWS) -> "RollingAggregates":
+        aggregates = cls(windows)
+        days = snapshot.get("days") if isinstance(snapshot, dict) else None
+        for day, values in sorted((days or {}).items()):
+            if isinstance(values, dict):
+                aggregates.add(day, values)
+        return aggregates
+
+
+def load_aggregates(tokenstore: str) -> RollingAggregates:
+    """A user's aggregates, empty if nothing was synced yet."""
+    try:
+        with open(Path(tokenstore) / AGGREGATES_FILE) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        snapshot = {}
+    return RollingAggregates.from_snapshot(snapshot)
+
+
+def update_aggregates(tokenstore: str, days: dict) -> RollingAggregates:
+    """Merge {date: {series: value}} into the stored aggregates and save them."""
+    with _lock:
+        # Re-read so days saved by another sync meanwhile are kept
+        aggregates = load_aggregates(tokenstore)
+        for day, values in sorted(days.items()):
+            aggregates.add(day, values)
+
+        atomic_write_json(Path(tokenstore) / AGGREGATES_FILE, aggregates.snapshot())
+    return aggregates
@@ -4,7 +4,10 @@ Garmin Connect HTTP API service.
 Deployed separately (Railway/Render) for hosted mode.
 """
 import os
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from garmin_service import (
     authenticate,
@@ -15,16 +18,70 @@ from garmin_service import (
     fetch_body_battery,
     fetch_heart_rate,
     fetch_activities,
+    InvalidOptions,
     fetch_activities_batch,
+    fetch_aggregates,
+    stream_activity_history,
+    series_options,
+    window_days_option,
     sync_all,
+    stream_sync_all,
+    sync_incremental,
+    upstream_scheduler,
 )
+from content_hash import content_hash
+from encoding import COMPRESS_MIN_BYTES, CONTENT_CODINGS, JSON, MEDIA_TYPES, compress, dumps_json, encode
+from jobs import QUEUED, RUNNING, JobQueue
+from metrics import (
+    HTTP_COMPRESS_SECONDS,
+    HTTP_JSON_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    log_if_slow,
+    new_trace_id,
+    render,
+)
+from scheduler import BULK, INTERACTIVE, current_lane
+
+
+class NegotiatedJSONProvider(DefaultJSONProvider):
+    """JSON provider whose responses use the format the request's Accept prefers.
+
+    `jsonify` responses are encoded as JSON (with orjson when available) or
+    MessagePack, see encoding.py, and their serialization time is recorded.
+    """
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        media_type = JSON
+        if has_request_context():
+            media_type = request.accept_mimetypes.best_match(MEDIA_TYPES, default=JSON)
+        with HTTP_JSON_SECONDS.time(format=media_type):
+            body = encode(obj, media_type)
+        response = self._app.response_class(body, mimetype=media_type)
+        response.vary.add("Accept")
+        return response
+
 
 app = Flask(__name__)
+app.json = NegotiatedJSONProvider(app)
 CORS(app)
 
+# Background jobs for long syncs, run outside the request threads
+jobs = JobQueue()
+
 # Simple API key auth for the service
 API_KEY = os.environ.get("GARMIN_SERVICE_API_KEY", "")
 
+# Routes doing bulk work; they run in the bulk upstream lane and are capped
+# at BULK_REQUEST_SLOTS concurrent requests per process so request threads
+# stay free for interactive calls
+BULK_ROUTES = {"/sync-all", "/sync-incremental", "/activities-batch", "/activities-import"}
+BULK_REQUEST_SLOTS = int(os.environ.get("GARMIN_BULK_REQUEST_SLOTS", "2"))
+bulk_slots = threading.BoundedSemaphore(max(1, BULK_REQUEST_SLOTS))
+
+# Bearer token for /metrics (which skips the API key check); empty means open
+METRICS_TOKEN = os.environ.get("GARMIN_METRICS_TOKEN", "")
+
 
 def check_api_key():
     """Verify API key if configured."""
@@ -34,12 +91,114 @@ def check_api_key():
     return auth_header == f"Bearer {API_KEY}"
 
 
+def wants_stream(data: dict) -> bool:
+    """Whether the caller asked for NDJSON streaming output."""
+    accept = request.headers.get("Accept", "")
+    return bool(data.get("stream")) or "application/x-ndjson" in accept
+
+
+def ndjson_response(records) -> Response:
+    """Stream an iterable of dicts as newline-delimited JSON."""
+    lines = (dumps_json(record) + b"\n" for record in records)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+def conditional_response(result: dict) -> Response:
+    """Response tagged with the content hash of its data.
+
+    Returns an empty 304 instead when the caller's If-None-Match already
+    names that hash.
+    """
+    if not result.get("success") or "data" not in result:
+        return jsonify(result)
+    etag = content_hash(result["data"])
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(result)
+    # Weak: the same data may be sent as JSON or MessagePack, compressed or not
+    response.set_etag(etag, weak=True)
+    return response
+
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    g.trace_id = new_trace_id(request.headers.get("X-Request-Id"))
+
+
 @app.before_request
 def verify_auth():
+    if request.path == "/metrics":
+        return None
     if not check_api_key():
         return jsonify({"error": "Unauthorized"}), 401
 
 
+@app.before_request
+def assign_lane():
+    if request.path not in BULK_ROUTES:
+        current_lane.set(INTERACTIVE)
+        return None
+    if not bulk_slots.acquire(blocking=False):
+        response = jsonify({
+            "success": False,
+            "error": "Too many bulk requests in progress; retry later or submit a job under /jobs",
+        })
+        return response, 429, {"Retry-After": "5"}
+    g.bulk_slot = True
+    current_lane.set(BULK)
+
+
+@app.teardown_request
+def release_bulk_slot(exc):
+    # Streaming responses tear down once the stream has finished
+    if g.pop("bulk_slot", False):
+        bulk_slots.release()
+
+
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    log_if_slow(f"{request.method} {request.path} -> {response.status_code}", elapsed)
+    response.headers["X-Trace-Id"] = g.trace_id
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress large buffered bodies with the best coding the caller accepts.
+
+    Registered after record_request so it runs first and counts toward the
+    request duration.
+    """
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    if (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    coding = request.accept_encodings.best_match(CONTENT_CODINGS)
+    if coding:
+        with HTTP_COMPRESS_SECONDS.time(encoding=coding):
+            response.set_data(compress(response.get_data(), coding))
+        response.headers["Content-Encoding"] = coding
+    return response
+
+
+@app.errorhandler(InvalidOptions)
+def invalid_options(e):
+    return jsonify({"success": False, "error": str(e)}), 400
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
@@ -66,43 +225,74 @@ def check_auth_endpoint():
 @app.route("/sleep", methods=["POST"])
 def sleep_endpoint():
     data = request.json or {}
-    result = fetch_sleep_data(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_sleep_data(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+    )
+    return conditional_response(result)
 
 
 @app.route("/activity", methods=["POST"])
 def activity_endpoint():
     data = request.json or {}
-    result = fetch_activity_summary(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_activity_summary(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+    )
+    return conditional_response(result)
 
 
 @app.route("/stress", methods=["POST"])
 def stress_endpoint():
     data = request.json or {}
-    result = fetch_stress_data(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_stress_data(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+    )
+    return conditional_response(result)
 
 
 @app.route("/body-battery", methods=["POST"])
 def body_battery_endpoint():
     data = request.json or {}
-    result = fetch_body_battery(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_body_battery(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+    )
+    return conditional_response(result)
 
 
 @app.route("/heart-rate", methods=["POST"])
 def heart_rate_endpoint():
     data = request.json or {}
-    result = fetch_heart_rate(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_heart_rate(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+        series_options(data),
+    )
+    return conditional_response(result)
 
 
 @app.route("/activities", methods=["POST"])
 def activities_endpoint():
     data = request.json or {}
-    result = fetch_activities(data.get("date", ""), data.get("user_id"))
-    return jsonify(result)
+    result = fetch_activities(
+        data.get("date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+    )
+    return conditional_response(result)
+
+
+@app.route("/aggregates", methods=["POST"])
+def aggregates_endpoint():
+    data = request.json or {}
+    return conditional_response(fetch_aggregates(data.get("user_id")))
 
 
 @app.route("/activities-batch", methods=["POST"])
@@ -112,21 +302,164 @@ def activities_batch_endpoint():
         data.get("start_date", ""),
         data.get("end_date", ""),
         data.get("user_id"),
+        bool(data.get("refresh")),
+        data.get("layout"),
     )
     return jsonify(result)
 
 
+@app.route("/activities-import", methods=["POST"])
+def activities_import_endpoint():
+    """Full-history activity import, streamed as NDJSON one window at a time."""
+    data = request.json or {}
+    return ndjson_response(stream_activity_history(
+        data.get("start_date", ""),
+        data.get("end_date", ""),
+        data.get("user_id"),
+        bool(data.get("refresh")),
+        bool(data.get("resume", True)),
+        window_days_option(data),
+    ))
+
+
 @app.route("/sync-all", methods=["POST"])
 def sync_all_endpoint():
     data = request.json or {}
+    if wants_stream(data):
+        # One line per completed day, then a final status line
+        return ndjson_response(stream_sync_all(
+            data.get("start_date", ""),
+            data.get("end_date", ""),
+            data.get("user_id"),
+            bool(data.get("refresh")),
+            series_options(data),
+            data.get("known_hashes"),
+        ))
+
     result = sync_all(
         data.get("start_date", ""),
         data.get("end_date", ""),
         data.get("user_id"),
+        bool(data.get("refresh")),
+        series_options(data),
+        data.get("layout"),
+        data.get("known_hashes"),
+    )
+    return jsonify(result)
+
+
+@app.route("/sync-incremental", methods=["POST"])
+def sync_incremental_endpoint():
+    data = request.json or {}
+    result = sync_incremental(
+        data.get("user_id"),
+        data.get("start_date"),
+        data.get("end_date"),
+        bool(data.get("refresh")),
+        series_options(data),
+        data.get("known_hashes"),
     )
     return jsonify(result)
 
 
+@app.route("/jobs/sync-all", methods=["POST"])
+def sync_all_job_endpoint():
+    data = request.json or {}
+    job = jobs.submit("sync_all", {
+        "start_date": data.get("start_date", ""),
+        "end_date": data.get("end_date", ""),
+        "user_id": data.get("user_id"),
+        "refresh": bool(data.get("refresh")),
+        "series": series_options(data),
+        "layout": data.get("layout"),
+        "known_hashes": data.get("known_hashes"),
+    })
+    return jsonify({"success": True, "job": job}), 202
+
+
+@app.route("/jobs/activities-batch", methods=["POST"])
+def activities_batch_job_endpoint():
+    data = request.json or {}
+    job = jobs.submit("activities_batch", {
+        "start_date": data.get("start_date", ""),
+        "end_date": data.get("end_date", ""),
+        "user_id": data.get("user_id"),
+        "refresh": bool(data.get("refresh")),
+        "layout": data.get("layout"),
+    })
+    return jsonify({"success": True, "job": job}), 202
+
+
+@app.route("/jobs/activities-import", methods=["POST"])
+def activities_import_job_endpoint():
+    data = request.json or {}
+    job = jobs.submit("activities_import", {
+        "start_date": data.get("start_date", ""),
+        "end_date": data.get("end_date", ""),
+        "user_id": data.get("user_id"),
+        "refresh": bool(data.get("refresh")),
+        "resume": bool(data.get("resume", True)),
+        "window_days": window_days_option(data),
+    })
+    return jsonify({"success": True, "job": job}), 202
+
+
+@app.route("/jobs/sync-batch", methods=["POST"])
+def sync_batch_job_endpoint():
+    """Queue one sync job per user in `user_ids` (incremental unless told otherwise)."""
+    data = request.json or {}
+    user_ids = data.get("user_ids") or []
+    if (not isinstance(user_ids, list) or not user_ids
+            or not all(isinstance(user_id, str) and user_id for user_id in user_ids)):
+        return jsonify({"success": False, "error": "user_ids must be a non-empty list of non-empty strings"}), 400
+
+    incremental = data.get("incremental", True)
+    if not incremental and not (data.get("start_date") and data.get("end_date")):
+        return jsonify({"success": False, "error": "start_date and end_date are required"}), 400
+
+    batch = jobs.submit_batch("sync_incremental" if incremental else "sync_all", user_ids, {
+        "start_date": data.get("start_date"),
+        "end_date": data.get("end_date"),
+        "refresh": bool(data.get("refresh")),
+        "series": series_options(data),
+    })
+    return jsonify({"success": True, "batch": batch}), 202
+
+
+@app.route("/jobs/batches/<batch_id>", methods=["GET"])
+def batch_status_endpoint(batch_id):
+    batch = jobs.batch_status(batch_id)
+    if batch is None:
+        return jsonify({"success": False, "error": "Batch not found"}), 404
+    return jsonify({"success": True, "batch": batch})
+
+
+@app.route("/scheduler", methods=["GET"])
+def scheduler_endpoint():
+    """Upstream budget usage and the job backlog of this process."""
+    return jsonify({"upstream": upstream_scheduler.stats(), "jobs": jobs.backlog()})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status_endpoint(job_id):
+    job = jobs.status(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result_endpoint(job_id):
+    job, result = jobs.result(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    if result is None:
+        # Still queued/running (202), or interrupted without a result (409)
+        code = 202 if job["status"] in (QUEUED, RUNNING) else 409
+        return jsonify({"success": False, "job": job, "error": f"Job is {job['status']}"}), code
+    return jsonify({"job": job, **result})
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
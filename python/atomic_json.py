@@ -0,0 +1,29 @@
+"""
+Atomic writes of the JSON files kept next to a user's tokens.
+
+The JSON is written to a temporary file unique to the process and thread,
+then renamed over the target, so readers and concurrent writers never see
+a partially written file.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+
+def atomic_write_json(path, value, **dump_args) -> int:
+    """Replace the file at `path` with `value` as JSON; returns the JSON's length."""
+    path = Path(path)
+    payload = json.dumps(value, **dump_args)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        with open(tmp, "w") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return len(payload)
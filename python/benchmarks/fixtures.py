@@ -0,0 +1,237 @@
+"""
+Synthetic Garmin payloads for the benchmarks.
+
+Shapes follow the raw garminconnect responses, including the bulky fields
+the service throws away, so depersonalization is measured on realistic
+input. Everything is generated from a fixed seed; nothing touches Garmin.
+"""
+import random
+from datetime import date, datetime, timedelta, timezone
+
+SEED = 42
+DAY = "2024-03-15"
+HR_INTERVAL_MS = 2 * 60 * 1000
+
+
+def _day_start_ms(day: str) -> int:
+    start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000)
+
+
+def heart_rate_day(day: str = DAY, interval_ms: int = HR_INTERVAL_MS, gap_rate: float = 0.03,
+                   seed: int = SEED) -> dict:
+    """get_heart_rates() for one full day: a 2-minute [timestamp, bpm] series with gaps."""
+    rng = random.Random(seed)
+    start = _day_start_ms(day)
+    values = []
+    bpm = 60.0
+    for i in range(24 * 60 * 60 * 1000 // interval_ms):
+        hour = i * interval_ms / 3_600_000
+        target = 52 if hour < 6 else 75 if hour < 22 else 60
+        bpm += (target - bpm) * 0.1 + rng.gauss(0, 3)
+        value = None if rng.random() < gap_rate else max(40, round(bpm))
+        values.append([start + i * interval_ms, value])
+    return {
+        "userProfilePK": 12345678,
+        "calendarDate": day,
+        "startTimestampGMT": f"{day}T00:00:00.0",
+        "endTimestampGMT": f"{day}T23:59:59.0",
+        "maxHeartRate": max(v for _, v in values if v),
+        "minHeartRate": min(v for _, v in values if v),
+        "restingHeartRate": 54,
+        "lastSevenDaysAvgRestingHeartRate": 55,
+        "heartRateValueDescriptors": [
+            {"key": "timestamp", "index": 0},
+            {"key": "heartrate", "index": 1},
+        ],
+        "heartRateValues": values,
+    }
+
+
+def sleep_day(day: str = DAY, seed: int = SEED) -> dict:
+    """get_sleep_data() for one night, with sleep levels and movement series."""
+    rng = random.Random(seed)
+    # Sleep from 23:00 the previous evening to 07:00
+    start = _day_start_ms(day) - 60 * 60 * 1000
+    end = start + 8 * 60 * 60 * 1000
+
+    levels = []
+    t = start
+    while t < end:
+        length = rng.randint(5, 40) * 60 * 1000
+        levels.append({
+            "startGMT": datetime.fromtimestamp(t / 1000, timezone.utc).isoformat(),
+            "endGMT": datetime.fromtimestamp(min(end, t + length) / 1000, timezone.utc).isoformat(),
+            "activityLevel": rng.choice([0.0, 1.0, 2.0, 3.0]),
+        })
+        t += length
+
+    minute = 60 * 1000
+    return {
+        "dailySleepDTO": {
+            "id": 1710460800000,
+            "userProfilePK": 12345678,
+            "calendarDate": day,
+            "sleepTimeSeconds": 27000,
+            "napTimeSeconds": 0,
+            "sleepWindowConfirmed": True,
+            "sleepStartTimestampGMT": start,
+            "sleepEndTimestampGMT": end,
+            "sleepStartTimestampLocal": start + 3_600_000,
+            "sleepEndTimestampLocal": end + 3_600_000,
+            "deepSleepSeconds": 5400,
+            "lightSleepSeconds": 14400,
+            "remSleepSeconds": 6600,
+            "awakeSleepSeconds": 1800,
+            "averageSpO2Value": 95.0,
+            "lowestSpO2Value": 88,
+            "averageRespirationValue": 14.0,
+            "avgSleepStress": 12.0,
+            "sleepScores": {
+                "overall": {"value": 81, "qualifierKey": "GOOD"},
+                "totalDuration": {"qualifierKey": "GOOD", "optimalStart": 28800.0, "optimalEnd": 28800.0},
+                "stress": {"qualifierKey": "EXCELLENT", "optimalStart": 0.0, "optimalEnd": 15.0},
+                "remPercentage": {"value": 24, "qualifierKey": "EXCELLENT"},
+            },
+        },
+        "sleepMovement": [
+            {
+                "startGMT": datetime.fromtimestamp((start + i * minute) / 1000, timezone.utc).isoformat(),
+                "endGMT": datetime.fromtimestamp((start + (i + 1) * minute) / 1000, timezone.utc).isoformat(),
+                "activityLevel": rng.random() * 3,
+            }
+            for i in range(8 * 60)
+        ],
+        "sleepLevels": levels,
+        "wellnessEpochRespirationDataDTOList": [
+            {"startTimeGMT": start + i * 2 * minute, "respirationValue": 12 + rng.random() * 5}
+            for i in range(4 * 60)
+        ],
+        "remSleepData": True,
+        "restingHeartRate": 54,
+    }
+
+
+def user_summary_day(day: str = DAY, seed: int = SEED) -> dict:
+    """get_user_summary() for one day (a trimmed but representative field set)."""
+    rng = random.Random(seed)
+    summary = {
+        "userProfileId": 12345678,
+        "displayName": "someone",
+        "userDailySummaryId": 12345678,
+        "calendarDate": day,
+        "totalSteps": rng.randint(2000, 20000),
+        "totalDistanceMeters": rng.randint(1500, 15000),
+        "activeKilocalories": rng.randint(100, 1200),
+        "totalKilocalories": rng.randint(1800, 3500),
+        "floorsAscended": rng.random() * 20,
+        "floorsDescended": rng.random() * 20,
+        "intensityMinutesGoal": 150,
+        "moderateIntensityMinutes": rng.randint(0, 60),
+        "vigorousIntensityMinutes": rng.randint(0, 40),
+        "restingHeartRate": 54,
+        "minHeartRate": 48,
+        "maxHeartRate": 162,
+        "averageStressLevel": 31,
+        "maxStressLevel": 96,
+        "stressDuration": 30000,
+        "restStressDuration": 28000,
+        "activityStressDuration": 9000,
+        "lowStressDuration": 18000,
+        "mediumStressDuration": 9000,
+        "highStressDuration": 3000,
+        "bodyBatteryChargedValue": 60,
+        "bodyBatteryDrainedValue": 58,
+        "bodyBatteryHighestValue": 94,
+        "bodyBatteryLowestValue": 21,
+        "bodyBatteryMostRecentValue": 37,
+        "source": "GARMIN",
+        "privacyProtected": False,
+    }
+    # The real payload carries well over a hundred more fields
+    summary.update({f"extraField{i}": rng.random() for i in range(120)})
+    return summary
+
+
+def body_battery_range(start: str = "2023-03-16", days: int = 365, interval_ms: int = 3 * 60 * 1000,
+                       seed: int = SEED) -> list:
+    """get_body_battery(start, end) for `days` days, each with a full-day values array."""
+    rng = random.Random(seed)
+    first = date.fromisoformat(start)
+    items = []
+    for offset in range(days):
+        day = (first + timedelta(days=offset)).isoformat()
+        day_start = _day_start_ms(day)
+        level = rng.randint(20, 90)
+        values = []
+        for i in range(24 * 60 * 60 * 1000 // interval_ms):
+            level = min(100, max(5, level + rng.choice((-1, 0, 0, 1))))
+            values.append([day_start + i * interval_ms, level])
+        items.append({
+            "date": day,
+            "charged": rng.randint(20, 80),
+            "drained": rng.randint(20, 80),
+            "startTimestampGMT": f"{day}T00:00:00.0",
+            "endTimestampGMT": f"{day}T23:59:59.0",
+            "startTimestampLocal": f"{day}T01:00:00.0",
+            "endTimestampLocal": f"{day}T00:59:59.0",
+            "bodyBatteryValuesArray": values,
+            "bodyBatteryValueDescriptorDTOList": [
+                {"bodyBatteryValueDescriptorIndex": 0, "bodyBatteryValueDescriptorKey": "timestamp"},
+                {"bodyBatteryValueDescriptorIndex": 1, "bodyBatteryValueDescriptorKey": "bodyBatteryLevel"},
+            ],
+            "bodyBatteryDynamicFeedbackEvent": {"eventTimestampGMT": f"{day}T20:00:00.0", "bodyBatteryLevel": "MODERATE"},
+            "bodyBatteryActivityEvent": [],
+        })
+    return items
+
+
+ACTIVITY_TYPES = ("running", "cycling", "walking", "strength_training", "swimming", "yoga")
+
+
+def activities_year(start: str = "2023-03-16", days: int = 365, per_day: float = 1.5,
+                    seed: int = SEED) -> list:
+    """get_activities_by_date(start, end) for a year of training."""
+    rng = random.Random(seed)
+    first = date.fromisoformat(start)
+    activities = []
+    activity_id = 10_000_000_000
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        count = int(per_day) + (rng.random() < per_day % 1)
+        for _ in range(count):
+            activity_id += rng.randint(1, 1000)
+            type_key = rng.choice(ACTIVITY_TYPES)
+            duration = rng.uniform(900, 7200)
+            activities.append({
+                "activityId": activity_id,
+                "activityName": f"{type_key.replace('_', ' ').title()}",
+                "description": None,
+                "startTimeLocal": f"{day.isoformat()} {rng.randint(5, 20):02d}:{rng.randint(0, 59):02d}:00",
+                "startTimeGMT": f"{day.isoformat()} 12:00:00",
+                "activityType": {"typeId": 1, "typeKey": type_key, "parentTypeId": 17, "isHidden": False},
+                "eventType": {"typeId": 9, "typeKey": "uncategorized"},
+                "distance": rng.uniform(0, 40000),
+                "duration": duration,
+                "elapsedDuration": duration * 1.05,
+                "movingDuration": duration * 0.95,
+                "elevationGain": rng.uniform(0, 800),
+                "elevationLoss": rng.uniform(0, 800),
+                "averageSpeed": rng.uniform(1, 10),
+                "maxSpeed": rng.uniform(5, 15),
+                "startLatitude": 47.0 + rng.random(),
+                "startLongitude": 8.0 + rng.random(),
+                "ownerId": 12345678,
+                "ownerDisplayName": "someone",
+                "ownerFullName": "Some One",
+                "calories": rng.uniform(100, 1500),
+                "averageHR": rng.uniform(100, 160),
+                "maxHR": rng.uniform(150, 190),
+                "steps": rng.randint(0, 20000),
+                "deviceId": 3400000000,
+                "hasPolyline": True,
+                "splitSummaries": [
+                    {"noOfSplits": 1, "totalAscent": 10.0, "duration": duration, "splitType": "INTERVAL_ACTIVE"}
+                ],
+            })
+    return activities
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the service's CPU hot paths.
+
+Runs offline against the synthetic payloads in fixtures.py. Usage, from
+the python/ directory:
+
+    python benchmarks/run.py                      # print timings
+    python benchmarks/run.py --save base.json     # save a baseline
+    python benchmarks/run.py --compare base.json  # compare, exit 1 on regressions
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import date, datetime, timezone
+from itertools import count
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fixtures  # noqa: E402
+from aggregates import RollingAggregates, day_values  # noqa: E402
+from content_hash import hash_metrics  # noqa: E402
+from encoding import JSON, MSGPACK, encode  # noqa: E402
+from garmin_service import (  # noqa: E402
+    SYNC_METRICS,
+    activities_columnar,
+    add_sleep_heart_rate,
+    build_sync_day,
+    depersonalize_activity,
+    depersonalize_body_battery,
+    depersonalize_heart_rate,
+    depersonalize_sleep,
+    group_activities_by_date,
+)
+
+
+def _sleep_heart_rate():
+    sleep = depersonalize_sleep(fixtures.sleep_day())
+    hr = fixtures.heart_rate_day()
+    return lambda: add_sleep_heart_rate(dict(sleep), hr)
+
+
+def _sync_day_outcomes(day: str = fixtures.DAY):
+    return {
+        "sleep": (fixtures.sleep_day(day), None),
+        "spo2": ({"avgSleepSpO2": 95}, None),
+        "heartRate": (fixtures.heart_rate_day(day), None),
+        "activity": (fixtures.user_summary_day(day), None),
+        "stress": ({"calendarDate": day, "overallStressLevel": 30}, None),
+        "bodyBattery": (fixtures.body_battery_range(day, days=1), None),
+    }
+
+
+def _sync_day():
+    outcomes = _sync_day_outcomes()
+    return lambda: build_sync_day(outcomes)
+
+
+def _hash_sync_day():
+    day = build_sync_day(_sync_day_outcomes())
+    return lambda: hash_metrics(dict(day), SYNC_METRICS)
+
+
+def _aggregate_day():
+    """Adding one new day to a user's rolling aggregates."""
+    values = day_values(build_sync_day(_sync_day_outcomes()))
+    aggregates = RollingAggregates()
+    days = (date.fromordinal(ordinal).isoformat() for ordinal in count(date(2000, 1, 1).toordinal()))
+    return lambda: aggregates.add(next(days), values)
+
+
+def _encode_sync(media_type: str):
+    """Encoding a week of sync_all output as `media_type`."""
+    days = [f"2024-03-{i:02d}" for i in range(1, 8)]
+    result = {"success": True, "dates": {day: build_sync_day(_sync_day_outcomes(day)) for day in days}}
+    return lambda: encode(result, media_type)
+
+
+def _with(fn, payload, **kwargs):
+    return lambda: fn(payload, **kwargs)
+
+
+# name -> setup returning the zero-argument callable to time
+BENCHMARKS = {
+    "depersonalize_sleep": lambda: _with(depersonalize_sleep, fixtures.sleep_day()),
+    "depersonalize_activity": lambda: _with(depersonalize_activity, fixtures.user_summary_day()),
+    "depersonalize_body_battery_365d": lambda: _with(depersonalize_body_battery, fixtures.body_battery_range()),
+    "depersonalize_heart_rate": lambda: _with(depersonalize_heart_rate, fixtures.heart_rate_day()),
+    "depersonalize_heart_rate_lttb300": lambda: _with(depersonalize_heart_rate, fixtures.heart_rate_day(), max_points=300),
+    "depersonalize_heart_rate_compact": lambda: _with(depersonalize_heart_rate, fixtures.heart_rate_day(), hr_format="compact"),
+    "sleep_heart_rate_window": _sleep_heart_rate,
+    "group_activities_by_date_1y": lambda: _with(group_activities_by_date, fixtures.activities_year()),
+    "activities_columnar_1y": lambda: _with(activities_columnar, fixtures.activities_year()),
+    "build_sync_day": _sync_day,
+    "hash_sync_day": _hash_sync_day,
+    "aggregate_day": _aggregate_day,
+    "encode_sync_7d_json": lambda: _encode_sync(JSON),
+    "encode_sync_7d_msgpack": lambda: _encode_sync(MSGPACK),
+}
+
+
+def measure(fn, repeat: int, min_time: float) -> dict:
+    """Time `fn`, calibrating the loop count so one repeat takes about `min_time`."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        # Scale towards min_time, at most 10x per step
+        number = min(number * 10, max(number * 2, int(number * min_time / max(elapsed, 1e-9))))
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number * 1e6)
+    return {
+        "median_us": round(statistics.median(runs), 3),
+        "min_us": round(min(runs), 3),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print each benchmark against the baseline; return the names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:40s} {result['median_us']:12.1f} us   (no baseline)")
+            continue
+        ratio = result["median_us"] / base["median_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:40s} {result['median_us']:12.1f} us   {ratio:6.2f}x baseline{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(setup(), args.repeat, args.min_time)
+        if not args.compare:
+            print(f"{name:40s} {results[name]['median_us']:12.1f} us")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["benchmarks"]
+        regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "createdAt": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "benchmarks": results,
+            }, f, indent=2)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
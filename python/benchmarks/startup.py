@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the CLI and the HTTP service.
+
+Every measurement starts a fresh interpreter, like a local subprocess call
+or a newly scaled-up instance: module import time, CLI time to first
+output, and time from launching gunicorn (with and without preloading) to
+the first /health response. Runs offline in a throwaway HOME. Usage, from
+the python/ directory:
+
+    python benchmarks/startup.py                   # print timings
+    python benchmarks/startup.py --save start.json # also save them as JSON
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent
+
+# Seconds to wait for the HTTP service to answer before giving up
+HTTP_TIMEOUT = 30
+
+
+def _env(home: str, **extra) -> dict:
+    return {**os.environ, "HOME": home, "PYTHONDONTWRITEBYTECODE": "1", **extra}
+
+
+def import_time(module: str, home: str) -> float:
+    """Seconds a fresh interpreter spends importing `module`."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=PYTHON_DIR, env=_env(home),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out)
+
+
+def cli_first_output(argv: list, home: str) -> float:
+    """Seconds from launching `garmin_service.py <argv>` to its first line of output."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "garmin_service.py", *argv], cwd=PYTHON_DIR,
+                            env=_env(home), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    proc.stdout.readline()
+    elapsed = time.perf_counter() - start
+    proc.communicate()
+    return elapsed
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_first_response(home: str, preload: bool) -> float:
+    """Seconds from launching gunicorn to the first successful GET /health."""
+    port = _free_port()
+    env = _env(home, PORT=str(port), GARMIN_PRELOAD="true" if preload else "false")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                            cwd=PYTHON_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < HTTP_TIMEOUT:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"no /health response within {HTTP_TIMEOUT}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+# name -> measurement taking the throwaway HOME
+BENCHMARKS = {
+    "import_garmin_service": lambda home: import_time("garmin_service", home),
+    "import_app": lambda home: import_time("app", home),
+    "cli_unknown_command": lambda home: cli_first_output(["nope"], home),
+    "cli_check_auth_unauthenticated": lambda home: cli_first_output(["check_auth"], home),
+    "cli_fetch_aggregates": lambda home: cli_first_output(["fetch_aggregates"], home),
+    "http_first_response_preload": lambda home: http_first_response(home, preload=True),
+    "http_first_response_no_preload": lambda home: http_first_response(home, preload=False),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        for name, run in BENCHMARKS.items():
+            if args.filter not in name:
+                continue
+            # One untimed run so every measurement sees a warm OS file cache
+            run(home)
+            runs = [run(home) * 1000 for _ in range(args.repeat)]
+            results[name] = {
+                "median_ms": round(statistics.median(runs), 1),
+                "min_ms": round(min(runs), 1),
+                "repeat": args.repeat,
+            }
+            print(f"{name:40s} {results[name]['median_ms']:10.1f} ms")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "createdAt": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "benchmarks": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Stable content hashes of depersonalized records.
+
+Sync output carries a hash per day and metric. Callers send the hashes
+they already hold back as `known_hashes` ({date: {metric: hash}}) and get
+unchanged metrics as None, listed under "notModified", instead of the full
+record. Single-day HTTP endpoints use the hash of their data as the ETag.
+"""
+import hashlib
+import json
+
+
+def content_hash(value) -> str:
+    """Hash of `value`'s canonical JSON (sorted keys, no whitespace)."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+def hash_metrics(day_data: dict, metrics, known: dict = None) -> dict:
+    """Add "hashes" for the fetched `metrics` of one day and drop those in `known`.
+
+    Metrics that failed or weren't fetched get no hash. A metric whose hash
+    matches `known` is set to None and listed under "notModified".
+    """
+    known = known if isinstance(known, dict) else {}
+    skipped = day_data.get("upToDate", ())
+    hashes = {}
+    unchanged = []
+    for metric in metrics:
+        if metric in skipped or f"{metric}Error" in day_data:
+            continue
+        hashes[metric] = content_hash(day_data[metric])
+        if known.get(metric) == hashes[metric]:
+            day_data[metric] = None
+            unchanged.append(metric)
+
+    day_data["hashes"] = hashes
+    if unchanged:
+        day_data["notModified"] = unchanged
+    return day_data
@@ -0,0 +1,66 @@
+"""
+Response body encodings and compression.
+
+JSON stays the default format. When orjson is installed it does the JSON
+encoding, several times faster than the json module on sync payloads.
+msgpack adds a binary format, and zstandard adds zstd next to gzip. All
+three are optional: without them the service falls back to the json
+module, JSON only and gzip.
+"""
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("GARMIN_COMPRESS_MIN_BYTES", "4096"))
+
+# gzip level (1-9); low levels get most of the size win for a fraction of the CPU
+GZIP_LEVEL = int(os.environ.get("GARMIN_GZIP_LEVEL", "4"))
+
+# zstd level (1-22)
+ZSTD_LEVEL = int(os.environ.get("GARMIN_ZSTD_LEVEL", "3"))
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Media types a response can be encoded as, in order of preference on ties
+MEDIA_TYPES = (JSON, MSGPACK, "application/x-msgpack") if msgpack else (JSON,)
+
+# Content codings a response can be compressed with, in order of preference
+CONTENT_CODINGS = ("zstd", "gzip") if zstandard else ("gzip",)
+
+
+def dumps_json(obj) -> bytes:
+    """Compact JSON with sorted keys, like Flask's jsonify."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def encode(obj, media_type: str = JSON) -> bytes:
+    """Serialize `obj` as `media_type` (one of MEDIA_TYPES)."""
+    if media_type in MEDIA_TYPES and media_type != JSON:
+        return msgpack.packb(obj, default=str)
+    return dumps_json(obj)
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """Compress `body` with `coding` (one of CONTENT_CODINGS)."""
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
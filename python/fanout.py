@@ -0,0 +1,115 @@
+"""
+Concurrent fan-out of per-day Garmin fetches.
+
+Runs every (day, metric) fetch for a date range on a bounded thread pool
+and hands back each day's results in date order as soon as that day is
+complete, so callers keep the same per-day shape as a sequential loop.
+"""
+import contextvars
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from idle_lru import IdleLRU
+
+# Upstream calls a single user may have in flight at once (across all syncs)
+SYNC_CONCURRENCY = int(os.environ.get("GARMIN_SYNC_CONCURRENCY", "4"))
+
+# Days scheduled ahead of the one currently being returned
+SYNC_WINDOW_DAYS = int(os.environ.get("GARMIN_SYNC_WINDOW_DAYS", "7"))
+
+class UserSlots:
+    """Upstream calls one user has in flight, shared by all of the user's syncs.
+
+    Each call waits until fewer than its own `limit` calls are in flight,
+    so every sync gets the concurrency it asked for, not the first one's.
+    """
+
+    def __init__(self):
+        self.users = 0  # calls holding or waiting for a slot
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, limit: int):
+        with self._cond:
+            self.users += 1
+            while self.in_flight >= limit:
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self.users -= 1
+                # Waiters may have different limits, so wake them all
+                self._cond.notify_all()
+
+
+_user_slots = IdleLRU(lambda key: UserSlots(), in_use=lambda slots: slots.users > 0)
+
+
+def user_slots(key: str) -> UserSlots:
+    """In-flight upstream calls for one user."""
+    return _user_slots.get(key)
+
+
+def _run_limited(slots, limit, fetch, day):
+    with slots.hold(limit):
+        return fetch(day)
+
+
+def _outcome(future):
+    """(value, None) on success, (None, exception) on failure."""
+    try:
+        return future.result(), None
+    except Exception as e:
+        return None, e
+
+
+def fan_out(days, fetchers, user_key: str, concurrency: int = SYNC_CONCURRENCY,
+            window: int = SYNC_WINDOW_DAYS):
+    """Run `fetchers[metric](day)` for every day and metric concurrently.
+
+    `fetchers` is a {metric: fetch} dict, or a callable returning that dict
+    for a given day when days need different metrics.
+    Yields `(day, {metric: (value, error)})` in the order of `days`. At most
+    `window` days are in flight, so memory stays flat for long ranges, and
+    a call only starts while fewer than `concurrency` calls for `user_key`,
+    across all of the user's syncs, are in flight.
+    """
+    slots = user_slots(user_key)
+    limit = max(1, concurrency)
+    days = iter(days)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=limit) as pool:
+        def schedule_next():
+            day = next(days, None)
+            if day is None:
+                return
+            day_fetchers = fetchers(day) if callable(fetchers) else fetchers
+            futures = {
+                # Copy the caller's context so trace ids follow the work
+                metric: pool.submit(contextvars.copy_context().run, _run_limited, slots, limit, fetch, day)
+                for metric, fetch in day_fetchers.items()
+            }
+            pending.append((day, futures))
+
+        try:
+            for _ in range(max(1, window)):
+                schedule_next()
+
+            while pending:
+                day, futures = pending.popleft()
+                outcomes = {metric: _outcome(f) for metric, f in futures.items()}
+                schedule_next()
+                yield day, outcomes
+        finally:
+            # Caller stopped early: don't start fetches nobody will read
+            for _, futures in pending:
+                for f in futures.values():
+                    f.cancel()
@@ -1,17 +1,55 @@
 #!/usr/bin/env python3
 """
 Garmin Connect data fetching service.
-Called from SvelteKit via subprocess.
+Called from SvelteKit via subprocess, either once per command or as a
+long-running `serve` worker.
 
 This service de-personalizes data by stripping all user identifiers
 and only returning health metrics.
 """
 import sys
 import json
+import importlib
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
+from functools import partial
 from pathlib import Path
-from garminconnect import Garmin
+from aggregates import day_values, load_aggregates, update_aggregates
+from content_hash import hash_metrics
+from encoding import JSON, MEDIA_TYPES, MSGPACK, dumps_json, encode
+from fanout import fan_out
+from metrics import (
+    DEPERSONALIZE_SECONDS,
+    GET_CLIENT_SECONDS,
+    LOGIN_SECONDS,
+    UPSTREAM_ERRORS,
+    UPSTREAM_SECONDS,
+    log_if_slow,
+    timed,
+)
+from import_cursor import clear_cursor, load_cursor, resume_point, save_cursor
+from range_fetch import RangeFetcher, date_windows, split_by_day
+from rate_limit import UpstreamGuard
+from response_cache import CACHE_DISABLED, MISS, cache_for, is_finalized
+from scheduler import BULK, INTERACTIVE, FairScheduler, current_lane
+from session_pool import SessionPool
+from projections import (
+    ACTIVITY,
+    BODY_BATTERY,
+    COLUMNAR,
+    DAILY_SUMMARY,
+    HEART_RATE,
+    SLEEP,
+    STRESS,
+    columnar,
+)
+from singleflight import SingleFlight, coalesce
+from timeseries import encode_compact, lttb, points_for_resolution, window_stats
+from watermarks import advance, load_watermarks, needs_sync, next_day, save_watermarks
 
 # Default token storage location (for local/single-user mode)
 DEFAULT_TOKENSTORE = str(Path.home() / ".garminconnect")
@@ -31,17 +69,146 @@ def get_tokenstore(user_id: str = None) -> str:
     return str(base / user_id)
 
 
-def get_client(user_id: str = None):
+# "module:Class" used instead of garminconnect.Garmin, e.g. the load-test stub
+CLIENT_FACTORY = os.environ.get("GARMIN_CLIENT_FACTORY", "")
+
+
+def garmin_class():
+    """The Garmin client class, honoring GARMIN_CLIENT_FACTORY."""
+    if not CLIENT_FACTORY:
+        # Imported on first use: garminconnect and its HTTP/OAuth stack are
+        # most of this module's import time, and many commands never log in
+        from garminconnect import Garmin
+        return Garmin
+    module_name, _, name = CLIENT_FACTORY.partition(":")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def warm_up():
+    """Import what commands otherwise load on first use (the Garmin client)."""
+    garmin_class()
+
+
+def login_with_tokens(tokenstore: str):
     """Initialize Garmin client with saved tokens."""
+    client = garmin_class()()
+    start = time.perf_counter()
+    try:
+        client.login(tokenstore)
+    finally:
+        elapsed = time.perf_counter() - start
+        LOGIN_SECONDS.observe(elapsed)
+        log_if_slow("login", elapsed)
+    return client
+
+
+# Warm, logged-in clients shared by every call in this process
+sessions = SessionPool(login_with_tokens)
+
+
+def session_key(user_id: str = None) -> str:
+    """Pool key for a user; local mode shares a single session."""
+    return user_id or "local-user"
+
+
+def get_client(user_id: str = None):
+    """Get a logged-in Garmin client, reusing a pooled session when possible."""
     tokenstore = get_tokenstore(user_id)
     if not Path(tokenstore).exists():
         raise Exception("Not authenticated. Please authenticate first.")
 
-    client = Garmin()
-    client.login(tokenstore)
-    return client
+    with GET_CLIENT_SECONDS.time():
+        return sessions.acquire(session_key(user_id), tokenstore)
+
+
+# Requests in flight to Garmin, shared round-robin between users
+upstream_scheduler = FairScheduler()
+
+# Rate limits, retries and circuit breaker shared by every Garmin API call
+upstream_guard = UpstreamGuard(upstream_scheduler)
 
 
+def upstream(client, user_id: str, method: str, *args):
+    """Make one Garmin API call (`client.<method>(*args)`) under upstream_guard.
+
+    Every attempt, including retries, is timed and counted in the metrics.
+    """
+    fn = getattr(client, method)
+
+    def attempt(*call_args):
+        start = time.perf_counter()
+        try:
+            return fn(*call_args)
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            UPSTREAM_SECONDS.observe(elapsed, method=method)
+            log_if_slow(f"{method}({', '.join(call_args)})", elapsed)
+
+    return upstream_guard.call(session_key(user_id), attempt, *args)
+
+
+# Concurrent identical upstream fetches (same user, method and dates) share one call
+upstream_flight = SingleFlight("upstream")
+
+
+def cached_call(client, user_id: str, method: str, *dates: str, refresh: bool = False):
+    """Call `client.<method>(*dates)` through the user's on-disk response cache.
+
+    Entries are keyed by method and dates; the last date decides when the
+    entry becomes immutable. `refresh` skips the cached copy and stores the
+    fresh response. Identical fetches already in flight are joined.
+    """
+    flight_key = (session_key(user_id), method, dates)
+    if CACHE_DISABLED:
+        return upstream_flight.do(flight_key, upstream, client, user_id, method, *dates)
+
+    cache = cache_for(get_tokenstore(user_id))
+    key = "_".join(dates)
+    if not refresh:
+        data = cache.get(method, key)
+        if data is not MISS:
+            return data
+
+    def fetch_and_store():
+        data = upstream(client, user_id, method, *dates)
+        cache.set(method, key, data, day=dates[-1], has_data=has_data(method, data))
+        return data
+
+    return upstream_flight.do(flight_key, fetch_and_store)
+
+
+def cached_range_call(client, user_id: str, method: str, start_date: str, end_date: str,
+                      refresh: bool = False) -> dict:
+    """Call a range endpoint `client.<method>(start, end)` and return {day: items}.
+
+    Each day is cached under the same key as a single-day call, so only the
+    span of days missing from the cache is requested upstream.
+    """
+    days = list(date_range(start_date, end_date))
+    cache = None if CACHE_DISABLED else cache_for(get_tokenstore(user_id))
+
+    by_day = {}
+    if cache and not refresh:
+        for day in days:
+            data = cache.get(method, day)
+            if data is not MISS:
+                by_day[day] = data
+
+    missing = [day for day in days if day not in by_day]
+    if missing:
+        fetched = split_by_day(upstream(client, user_id, method, missing[0], missing[-1]),
+                               list(date_range(missing[0], missing[-1])))
+        for day, items in fetched.items():
+            if cache:
+                cache.set(method, day, items, has_data=has_data(method, items))
+            by_day.setdefault(day, items)
+    return by_day
+
+
+@timed(DEPERSONALIZE_SECONDS, kind="sleep")
 def depersonalize_sleep(data: dict) -> dict:
     """Remove personal identifiers from sleep data, keep only metrics."""
     if not data:
@@ -52,121 +219,140 @@ def depersonalize_sleep(data: dict) -> dict:
     if not sleep:
         return {}
 
-    # Get sleep scores - nested structure
-    sleep_scores = sleep.get("sleepScores", {})
-    overall_score = None
-    if sleep_scores and isinstance(sleep_scores, dict):
-        overall = sleep_scores.get("overall", {})
-        if isinstance(overall, dict):
-            overall_score = overall.get("value")
-
-    return {
-        "calendarDate": sleep.get("calendarDate"),
-        "sleepTimeSeconds": sleep.get("sleepTimeSeconds"),
-        "deepSleepSeconds": sleep.get("deepSleepSeconds"),
-        "lightSleepSeconds": sleep.get("lightSleepSeconds"),
-        "remSleepSeconds": sleep.get("remSleepSeconds"),
-        "awakeSleepSeconds": sleep.get("awakeSleepSeconds"),
-        "sleepScore": overall_score,
-        "averageSpO2Value": sleep.get("averageSpO2Value"),
-        "averageRespirationValue": sleep.get("averageRespirationValue"),
-        "sleepStartTimestampGMT": sleep.get("sleepStartTimestampGMT"),
-        "sleepEndTimestampGMT": sleep.get("sleepEndTimestampGMT"),
-        "avgSleepStress": sleep.get("avgSleepStress"),
-    }
+    return SLEEP.project(sleep)
 
 
+@timed(DEPERSONALIZE_SECONDS, kind="activity")
 def depersonalize_activity(data: dict) -> dict:
     """Remove personal identifiers from activity summary."""
     if not data:
         return {}
 
-    return {
-        "calendarDate": data.get("calendarDate"),
-        "totalSteps": data.get("totalSteps"),
-        "totalDistanceMeters": data.get("totalDistanceMeters"),
-        "activeKilocalories": data.get("activeKilocalories"),
-        "totalKilocalories": data.get("totalKilocalories"),
-        "floorsAscended": data.get("floorsAscended"),
-        "floorsDescended": data.get("floorsDescended"),
-        "intensityMinutesGoal": data.get("intensityMinutesGoal"),
-        "moderateIntensityMinutes": data.get("moderateIntensityMinutes"),
-        "vigorousIntensityMinutes": data.get("vigorousIntensityMinutes"),
-        "restingHeartRate": data.get("restingHeartRate"),
-        "minHeartRate": data.get("minHeartRate"),
-        "maxHeartRate": data.get("maxHeartRate"),
-        "averageStressLevel": data.get("averageStressLevel"),
-        "maxStressLevel": data.get("maxStressLevel"),
-        "stressDuration": data.get("stressDuration"),
-        "restStressDuration": data.get("restStressDuration"),
-        "activityStressDuration": data.get("activityStressDuration"),
-        "lowStressDuration": data.get("lowStressDuration"),
-        "mediumStressDuration": data.get("mediumStressDuration"),
-        "highStressDuration": data.get("highStressDuration"),
-        "bodyBatteryChargedValue": data.get("bodyBatteryChargedValue"),
-        "bodyBatteryDrainedValue": data.get("bodyBatteryDrainedValue"),
-        "bodyBatteryHighestValue": data.get("bodyBatteryHighestValue"),
-        "bodyBatteryLowestValue": data.get("bodyBatteryLowestValue"),
-        "bodyBatteryMostRecentValue": data.get("bodyBatteryMostRecentValue"),
-    }
+    return DAILY_SUMMARY.project(data)
 
 
+@timed(DEPERSONALIZE_SECONDS, kind="stress")
 def depersonalize_stress(data: dict) -> dict:
     """Remove personal identifiers from stress data."""
     if not data:
         return {}
 
-    return {
-        "calendarDate": data.get("calendarDate"),
-        "overallStressLevel": data.get("overallStressLevel"),
-        "restStressDuration": data.get("restStressDuration"),
-        "activityStressDuration": data.get("activityStressDuration"),
-        "lowStressDuration": data.get("lowStressDuration"),
-        "mediumStressDuration": data.get("mediumStressDuration"),
-        "highStressDuration": data.get("highStressDuration"),
-        "stressQualifier": data.get("stressQualifier"),
-    }
+    return STRESS.project(data)
 
 
+@timed(DEPERSONALIZE_SECONDS, kind="bodyBattery")
 def depersonalize_body_battery(data: list) -> list:
     """Remove personal identifiers from body battery data."""
     if not data:
         return []
 
-    return [
-        {
-            "startTimestampGMT": item.get("startTimestampGMT"),
-            "endTimestampGMT": item.get("endTimestampGMT"),
-            "bodyBatteryLevel": item.get("bodyBatteryLevel"),
-            "bodyBatteryStatus": item.get("bodyBatteryStatus"),
-        }
-        for item in data
-        if isinstance(item, dict)
-    ]
+    return BODY_BATTERY.rows(data)
+
 
+@timed(DEPERSONALIZE_SECONDS, kind="heartRate")
+def depersonalize_heart_rate(data: dict, hr_format: str = "pairs", max_points: int = None,
+                             resolution: float = None) -> dict:
+    """Remove personal identifiers from heart rate data.
 
-def depersonalize_heart_rate(data: dict) -> dict:
-    """Remove personal identifiers from heart rate data."""
+    The time series can be downsampled on the server with LTTB, either to
+    `max_points` points or to one point per `resolution` seconds, and with
+    `hr_format="compact"` is returned delta-encoded (see timeseries.py)
+    instead of as [timestamp, bpm] pairs.
+    """
     if not data:
         return {}
 
-    return {
-        "calendarDate": data.get("calendarDate"),
-        "restingHeartRate": data.get("restingHeartRate"),
-        "maxHeartRate": data.get("maxHeartRate"),
-        "minHeartRate": data.get("minHeartRate"),
-        "heartRateValues": data.get("heartRateValues"),  # Time series data
-    }
+    values = data.get("heartRateValues")  # Time series data
+    if values and resolution:
+        max_points = min(max_points or len(values), points_for_resolution(values, resolution))
+    if values and max_points:
+        values = lttb(values, max_points)
+    if values is not None and hr_format == "compact":
+        values = encode_compact(values)
+
+    clean = HEART_RATE.project(data)
+    clean["heartRateValues"] = values
+    return clean
+
+
+class InvalidOptions(ValueError):
+    """Request arguments that can't be used; the HTTP service answers 400."""
+
+
+# Heart-rate series formats depersonalize_heart_rate can return
+HR_FORMATS = ("pairs", "compact")
+
+
+def positive_option(args: dict, name: str, kind=int):
+    """args[name] as a positive int or float, raising InvalidOptions otherwise."""
+    value = args[name]
+    try:
+        number = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        number = None
+    if isinstance(value, bool) or number is None or not 0 < number < math.inf:
+        raise InvalidOptions(f"{name} must be a positive {'integer' if kind is int else 'number'}")
+    return number
+
+
+def window_days_option(args: dict) -> int:
+    """History import window size from request args; 0 uses IMPORT_WINDOW_DAYS."""
+    return positive_option(args, "window_days") if args.get("window_days") else 0
+
+
+def series_options(args: dict) -> dict:
+    """Heart-rate series options (hr_format, max_points, resolution) from request args."""
+    options = {}
+    if args.get("hr_format"):
+        if args["hr_format"] not in HR_FORMATS:
+            raise InvalidOptions(f"hr_format must be one of {', '.join(HR_FORMATS)}")
+        options["hr_format"] = args["hr_format"]
+    if args.get("max_points"):
+        options["max_points"] = positive_option(args, "max_points")
+        if options["max_points"] < 3:
+            # LTTB always keeps the first and last point plus one per bucket
+            raise InvalidOptions("max_points must be at least 3")
+    if args.get("resolution"):
+        options["resolution"] = positive_option(args, "resolution", float)
+    return options
+
+
+# Sleep record fields filled from timeseries.window_stats over the sleep window
+SLEEP_HR_FIELDS = {
+    "avg": "avgSleepHR",
+    "min": "minSleepHR",
+    "max": "maxSleepHR",
+    "p10": "p10SleepHR",
+    "p50": "medianSleepHR",
+    "p90": "p90SleepHR",
+    "lowestRolling": "lowestSleepHR5Min",
+}
+
+
+@timed(DEPERSONALIZE_SECONDS, kind="sleepHeartRate")
+def add_sleep_heart_rate(sleep_result: dict, hr_data: dict):
+    """Add heart rate statistics for the sleep window to a sleep record."""
+    sleep_start = sleep_result.get('sleepStartTimestampGMT')
+    sleep_end = sleep_result.get('sleepEndTimestampGMT')
+    if not hr_data or not sleep_start or not sleep_end:
+        return
+
+    stats = window_stats(hr_data.get('heartRateValues'), sleep_start, sleep_end)
+    if stats:
+        for key, field in SLEEP_HR_FIELDS.items():
+            sleep_result[field] = stats[key]
 
 
 def authenticate(email: str, password: str, user_id: str = None) -> dict:
     """Initial authentication with Garmin Connect."""
     try:
-        client = Garmin(email, password)
+        client = garmin_class()(email, password)
         client.login()
         tokenstore = get_tokenstore(user_id)
         Path(tokenstore).mkdir(parents=True, exist_ok=True)
         client.garth.dump(tokenstore)
+        # Keep the fresh login so the next call doesn't log in again
+        sessions.put(session_key(user_id), tokenstore, client)
         return {"success": True, "message": "Authentication successful"}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -180,35 +366,29 @@ def check_auth(user_id: str = None) -> dict:
         client.get_full_name()  # This won't be stored, just used for verification
         return {"authenticated": True}
     except Exception:
+        # Don't keep handing out a session whose tokens no longer work
+        sessions.discard(session_key(user_id))
         return {"authenticated": False}
 
 
-def fetch_sleep_data(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_sleep_data(target_date: str, user_id: str = None, refresh: bool = False) -> dict:
     """Fetch sleep data for a specific date, including HR during sleep."""
     try:
         client = get_client(user_id)
-        data = client.get_sleep_data(target_date)
+        data = cached_call(client, user_id, "get_sleep_data", target_date, refresh=refresh)
         sleep_result = depersonalize_sleep(data)
 
         # Try to get heart rate during sleep
         try:
-            hr_data = client.get_heart_rates(target_date)
-            hr_values = hr_data.get('heartRateValues', [])
-            sleep_start = sleep_result.get('sleepStartTimestampGMT')
-            sleep_end = sleep_result.get('sleepEndTimestampGMT')
-
-            if hr_values and sleep_start and sleep_end:
-                sleep_hr = [v[1] for v in hr_values if v[0] and sleep_start <= v[0] <= sleep_end and v[1]]
-                if sleep_hr:
-                    sleep_result['avgSleepHR'] = round(sum(sleep_hr) / len(sleep_hr))
-                    sleep_result['minSleepHR'] = min(sleep_hr)
-                    sleep_result['maxSleepHR'] = max(sleep_hr)
+            hr_data = cached_call(client, user_id, "get_heart_rates", target_date, refresh=refresh)
+            add_sleep_heart_rate(sleep_result, hr_data)
         except Exception:
             pass  # HR data not available
 
         # Try to get SpO2 during sleep
         try:
-            spo2_data = client.get_spo2_data(target_date)
+            spo2_data = cached_call(client, user_id, "get_spo2_data", target_date, refresh=refresh)
             avg_spo2 = spo2_data.get('avgSleepSpO2') or spo2_data.get('averageSpO2')
             if avg_spo2:
                 sleep_result['averageSpO2Value'] = avg_spo2
@@ -220,230 +400,633 @@ def fetch_sleep_data(target_date: str, user_id: str = None) -> dict:
         return {"success": False, "error": str(e)}
 
 
-def fetch_activity_summary(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_activity_summary(target_date: str, user_id: str = None, refresh: bool = False) -> dict:
     """Fetch daily activity summary."""
     try:
         client = get_client(user_id)
-        data = client.get_user_summary(target_date)
+        data = cached_call(client, user_id, "get_user_summary", target_date, refresh=refresh)
         return {"success": True, "data": depersonalize_activity(data)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def fetch_stress_data(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_stress_data(target_date: str, user_id: str = None, refresh: bool = False) -> dict:
     """Fetch stress data."""
     try:
         client = get_client(user_id)
-        data = client.get_stress_data(target_date)
+        data = cached_call(client, user_id, "get_stress_data", target_date, refresh=refresh)
         return {"success": True, "data": depersonalize_stress(data)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def fetch_body_battery(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_body_battery(target_date: str, user_id: str = None, refresh: bool = False) -> dict:
     """Fetch body battery data."""
     try:
         client = get_client(user_id)
-        data = client.get_body_battery(target_date)
+        data = cached_call(client, user_id, "get_body_battery", target_date, refresh=refresh)
         return {"success": True, "data": depersonalize_body_battery(data)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def fetch_heart_rate(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_heart_rate(target_date: str, user_id: str = None, refresh: bool = False,
+                     series: dict = None) -> dict:
     """Fetch heart rate data."""
     try:
         client = get_client(user_id)
-        data = client.get_heart_rates(target_date)
-        return {"success": True, "data": depersonalize_heart_rate(data)}
+        data = cached_call(client, user_id, "get_heart_rates", target_date, refresh=refresh)
+        return {"success": True, "data": depersonalize_heart_rate(data, **(series or {}))}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def fetch_activities(target_date: str, user_id: str = None) -> dict:
+@coalesce
+def fetch_activities(target_date: str, user_id: str = None, refresh: bool = False) -> dict:
     """Fetch individual activities for a specific date."""
     try:
         client = get_client(user_id)
         # Get activities for the date range (single day)
-        activities = client.get_activities_by_date(target_date, target_date)
-
-        # De-personalize activities
-        clean_activities = []
-        for act in activities:
-            clean_activities.append({
-                "activityId": act.get("activityId"),
-                "activityName": act.get("activityName"),
-                "activityType": act.get("activityType", {}).get("typeKey") if isinstance(act.get("activityType"), dict) else None,
-                "startTimeLocal": act.get("startTimeLocal"),
-                "duration": act.get("duration"),  # seconds
-                "distance": act.get("distance"),  # meters
-                "calories": act.get("calories"),
-                "averageHR": act.get("averageHR"),
-                "maxHR": act.get("maxHR"),
-                "averageSpeed": act.get("averageSpeed"),  # m/s
-                "elevationGain": act.get("elevationGain"),
-                "steps": act.get("steps"),
-            })
+        activities = cached_call(client, user_id, "get_activities_by_date", target_date, target_date, refresh=refresh)
 
-        return {"success": True, "data": clean_activities}
+        return {"success": True, "data": ACTIVITY.rows(activities)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def fetch_activities_batch(start_date: str, end_date: str, user_id: str = None) -> dict:
-    """Fetch individual activities for a date range in a single API call."""
+@timed(DEPERSONALIZE_SECONDS, kind="activities")
+def group_activities_by_date(activities: list) -> dict:
+    """De-personalize activities and group them by their local start date."""
+    project = ACTIVITY.project
+    activities_by_date = {}
+    for act in activities:
+        # Extract date from startTimeLocal (format: "2024-01-15 08:30:00")
+        start_time = act.get("startTimeLocal", "")
+        act_date = start_time.split(" ")[0] if start_time else None
+
+        if not act_date:
+            continue
+
+        activities_by_date.setdefault(act_date, []).append(project(act))
+
+    return activities_by_date
+
+
+@timed(DEPERSONALIZE_SECONDS, kind="activities")
+def activities_columnar(activities: list) -> dict:
+    """Columnar form of group_activities_by_date: one array per field plus `date`."""
+    dated = [act for act in activities if isinstance(act, dict) and act.get("startTimeLocal")]
+    table = ACTIVITY.columns(dated)
+    table["fields"] = ["date", *table["fields"]]
+    table["columns"] = {"date": [act["startTimeLocal"].split(" ")[0] for act in dated], **table["columns"]}
+    return table
+
+
+@coalesce
+def fetch_activities_batch(start_date: str, end_date: str, user_id: str = None, refresh: bool = False,
+                           layout: str = None) -> dict:
+    """Fetch individual activities for a date range in a single API call.
+
+    With `layout="columnar"` the activities come back as one array per
+    field (see projections.py) instead of lists of dicts per date.
+    """
     try:
         client = get_client(user_id)
         # Get all activities for the date range
-        activities = client.get_activities_by_date(start_date, end_date)
+        activities = cached_call(client, user_id, "get_activities_by_date", start_date, end_date, refresh=refresh)
 
-        # Group activities by date
-        activities_by_date = {}
-        for act in activities:
-            # Extract date from startTimeLocal (format: "2024-01-15 08:30:00")
-            start_time = act.get("startTimeLocal", "")
-            act_date = start_time.split(" ")[0] if start_time else None
+        if layout == COLUMNAR:
+            return {"success": True, "layout": COLUMNAR, "data": activities_columnar(activities)}
+        return {"success": True, "data": group_activities_by_date(activities)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-            if not act_date:
-                continue
 
-            if act_date not in activities_by_date:
-                activities_by_date[act_date] = []
-
-            activities_by_date[act_date].append({
-                "activityId": act.get("activityId"),
-                "activityName": act.get("activityName"),
-                "activityType": act.get("activityType", {}).get("typeKey") if isinstance(act.get("activityType"), dict) else None,
-                "startTimeLocal": act.get("startTimeLocal"),
-                "duration": act.get("duration"),
-                "distance": act.get("distance"),
-                "calories": act.get("calories"),
-                "averageHR": act.get("averageHR"),
-                "maxHR": act.get("maxHR"),
-                "averageSpeed": act.get("averageSpeed"),
-                "elevationGain": act.get("elevationGain"),
-                "steps": act.get("steps"),
+def stream_activity_history(start_date: str, end_date: str, user_id: str = None, refresh: bool = False,
+                            resume: bool = True, window_days: int = None):
+    """Import activities for a long range, one window of days at a time.
+
+    The range is split into windows of IMPORT_WINDOW_DAYS that are fetched
+    concurrently through the per-user fan-out and the shared upstream
+    budget. Yields, oldest first, {"window", "activities": n, "data":
+    {date: [activities]}} per window, deduplicated by activityId, then
+    {"success": True, "done": True, "activities": total, "resumedFrom"},
+    or {"success": False, "error": ...} if a window fails. A cursor saved
+    once the caller has taken each window (see import_cursor.py) lets a
+    re-run of the same range with `resume` continue after it; the window
+    in flight when the import stopped is sent again.
+    """
+    try:
+        tokenstore = get_tokenstore(user_id)
+        cursor = load_cursor(tokenstore) if resume else {}
+        through = resume_point(cursor, start_date, end_date)
+        windows = date_windows(next_day(through) if through else start_date, end_date,
+                               window_days or IMPORT_WINDOW_DAYS)
+
+        client = get_client(user_id)
+
+        def fetch_window(window):
+            return cached_call(client, user_id, "get_activities_by_date", *window, refresh=refresh)
+
+        total = cursor.get("activities", 0) if through else 0
+        # Ids from the last delivered window catch duplicates across the resume point
+        seen = set(cursor.get("lastIds", ())) if through else set()
+        for (first, last), outcomes in fan_out(windows, {"activities": fetch_window}, session_key(user_id)):
+            activities, error = outcomes["activities"]
+            if error:
+                raise error
+
+            fresh = []
+            for act in activities or ():
+                if not isinstance(act, dict):
+                    continue
+                activity_id = act.get("activityId")
+                if activity_id is not None:
+                    if activity_id in seen:
+                        continue
+                    seen.add(activity_id)
+                fresh.append(act)
+            total += len(fresh)
+
+            yield {
+                "window": {"start_date": first, "end_date": last},
+                "activities": len(fresh),
+                "data": group_activities_by_date(fresh),
+            }
+            save_cursor(tokenstore, {
+                "start_date": start_date,
+                "end_date": end_date,
+                "through": last,
+                "activities": total,
+                "lastIds": [act.get("activityId") for act in fresh],
             })
 
-        return {"success": True, "data": activities_by_date}
+        clear_cursor(tokenstore)
+        yield {"success": True, "done": True, "activities": total, "resumedFrom": through}
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        yield {"success": False, "error": str(e)}
+
+
+# Upstream call behind each metric that sync_all fetches per day
+SYNC_FETCHERS = {
+    "sleep": "get_sleep_data",
+    "spo2": "get_spo2_data",
+    "heartRate": "get_heart_rates",
+    "activity": "get_user_summary",
+    "stress": "get_stress_data",
+    "bodyBattery": "get_body_battery",
+}
+
+# Field of an upstream response that stays null until the device has uploaded
+# the day; before that Garmin answers with placeholder records that only
+# carry the calendarDate. Other responses (lists) have data when non-empty.
+UPLOADED_FIELDS = {
+    "get_sleep_data": ("dailySleepDTO", "sleepTimeSeconds"),
+    "get_heart_rates": ("heartRateValues",),
+    "get_user_summary": ("totalSteps",),
+    "get_stress_data": ("overallStressLevel",),
+}
+
+
+def has_data(method: str, data) -> bool:
+    """Whether an upstream response of `method` holds measurements, not a placeholder."""
+    if not data:
+        return False
+    value = data
+    for key in UPLOADED_FIELDS.get(method, ()):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value is not None and value != []
+
+
+# Fetchers whose upstream call also accepts a date range with one item per day
+SYNC_RANGE_FETCHERS = {"bodyBattery"}
+
+# Output metrics of sync_all that are single records, split into columns by
+# the columnar layout
+COLUMNAR_METRICS = {"sleep", "activity", "stress"}
+
+# Fetchers each output metric of sync_all depends on
+SYNC_METRICS = {
+    "sleep": ("sleep", "spo2", "heartRate"),
+    "activity": ("activity",),
+    "stress": ("stress",),
+    "bodyBattery": ("bodyBattery",),
+    "heartRate": ("heartRate",),
+}
+
+# Days of activities one upstream call of the history import covers
+IMPORT_WINDOW_DAYS = int(os.environ.get("GARMIN_IMPORT_WINDOW_DAYS", "60"))
+
+# Days an incremental sync looks back when a user has no watermarks yet
+INCREMENTAL_LOOKBACK_DAYS = int(os.environ.get("GARMIN_INCREMENTAL_LOOKBACK_DAYS", "30"))
+
+# Days an empty finalized day holds a watermark back, waiting for a late device upload
+EMPTY_DAY_GRACE_DAYS = int(os.environ.get("GARMIN_EMPTY_DAY_GRACE_DAYS", "14"))
+
+
+def date_range(start_date: str, end_date: str):
+    """Yield ISO date strings from start_date through end_date."""
+    current = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    while current <= end:
+        yield current.isoformat()
+        current += timedelta(days=1)
+
+
+def build_sync_day(outcomes: dict, metrics=SYNC_METRICS, series: dict = None) -> dict:
+    """Assemble one day of sync_all output from raw (value, error) outcomes.
+
+    Metrics not in `metrics` were not fetched; they stay None and are
+    listed under "upToDate". `series` holds heart-rate series options.
+    """
+    day_data = {
+        "sleep": None,
+        "activity": None,
+        "stress": None,
+        "bodyBattery": None,
+        "heartRate": None
+    }
+
+    skipped = [key for key in day_data if key not in metrics]
+    if skipped:
+        day_data["upToDate"] = skipped
+
+    hr_raw, hr_error = outcomes.get("heartRate", (None, None))
+
+    sleep_raw, sleep_error = outcomes.get("sleep", (None, None))
+    if sleep_error:
+        day_data["sleepError"] = str(sleep_error)
+    else:
+        try:
+            sleep_result = depersonalize_sleep(sleep_raw)
+
+            # Add HR during sleep
+            try:
+                add_sleep_heart_rate(sleep_result, hr_raw)
+            except Exception:
+                pass
+
+            # Add SpO2 if available
+            try:
+                spo2_data, _ = outcomes["spo2"]
+                avg_spo2 = spo2_data.get('avgSleepSpO2') or spo2_data.get('averageSpO2')
+                if avg_spo2:
+                    sleep_result['averageSpO2Value'] = avg_spo2
+            except Exception:
+                pass
+
+            day_data["sleep"] = sleep_result
+        except Exception as e:
+            day_data["sleepError"] = str(e)
+
+    converters = (
+        ("activity", depersonalize_activity),
+        ("stress", depersonalize_stress),
+        ("bodyBattery", depersonalize_body_battery),
+        ("heartRate", partial(depersonalize_heart_rate, **(series or {}))),
+    )
+    for key, depersonalize in converters:
+        if key not in metrics:
+            continue
+        raw, error = outcomes[key]
+        if error:
+            day_data[f"{key}Error"] = str(error)
+            continue
+        try:
+            day_data[key] = depersonalize(raw)
+        except Exception as e:
+            day_data[f"{key}Error"] = str(e)
+
+    return day_data
+
+
+def iter_sync_days(start_date: str, end_date: str, user_id: str = None, refresh: bool = False,
+                   metrics_for=None, series: dict = None, known_hashes: dict = None):
+    """Yield (date, day_data, measured) for each day in the range as soon as it is complete.
+
+    Each day's upstream calls run concurrently (see fanout.py) and go
+    through the response cache, so finalized days are only fetched once;
+    the heart rate series is fetched once per day and reused for sleep HR.
+    Metrics with a range endpoint are fetched a block of days at a time.
+    `metrics_for(date)` may limit which output metrics a day fetches.
+    Each day carries content hashes of its metrics; those matching
+    `known_hashes` ({date: {metric: hash}}) come back as "notModified".
+    `measured` is the set of fetched metrics Garmin had data for (see has_data).
+    The synced days also update the user's rolling aggregates.
+    """
+    client = get_client(user_id)
+    fetchers = {
+        key: partial(cached_call, client, user_id, method, refresh=refresh)
+        for key, method in SYNC_FETCHERS.items()
+    }
+    # Range endpoints: one upstream call per block of days instead of per day
+    for key in SYNC_RANGE_FETCHERS:
+        fetch_range = partial(cached_range_call, client, user_id, SYNC_FETCHERS[key], refresh=refresh)
+        fetchers[key] = RangeFetcher(fetch_range, start_date, end_date)
+
+    day_metrics = {}
 
+    def day_fetchers(date_str):
+        metrics = day_metrics[date_str] = metrics_for(date_str) if metrics_for else SYNC_METRICS
+        needed = {name for metric in metrics for name in SYNC_METRICS[metric]}
+        return {name: fetch for name, fetch in fetchers.items() if name in needed}
 
-def sync_all(start_date: str, end_date: str, user_id: str = None) -> dict:
-    """Sync all data types for a date range."""
+    known_hashes = known_hashes if isinstance(known_hashes, dict) else {}
+    synced = {}
+    days = date_range(start_date, end_date)
+    try:
+        for date_str, outcomes in fan_out(days, day_fetchers, session_key(user_id)):
+            metrics = day_metrics.pop(date_str)
+            day_data = build_sync_day(outcomes, metrics, series)
+            synced[date_str] = day_values(day_data)
+            # Each output metric's own fetcher has the same name (see SYNC_METRICS)
+            measured = {m for m in metrics if has_data(SYNC_FETCHERS[m], outcomes[m][0])}
+            yield date_str, hash_metrics(day_data, SYNC_METRICS, known_hashes.get(date_str)), measured
+    finally:
+        if synced:
+            try:
+                update_aggregates(get_tokenstore(user_id), synced)
+            except OSError:
+                # Aggregates are derived data; failing to save them must not fail the sync
+                pass
+
+
+def sync_columnar(dates: dict) -> dict:
+    """Columnar form of sync_all's {date: day_data} output.
+
+    Record metrics (sleep, activity, stress) become one array per field
+    across the days; everything else (series, errors, upToDate) becomes
+    one array aligned with `dates`, with None for days that lack it.
+    """
+    days = list(dates.values())
+    keys = dict.fromkeys(key for day in days for key in day)
+    metrics = {}
+    for key in keys:
+        values = [day.get(key) for day in days]
+        metrics[key] = columnar(values) if key in COLUMNAR_METRICS else values
+    return {"success": True, "layout": COLUMNAR, "dates": list(dates), "metrics": metrics}
+
+
+@coalesce
+def sync_all(start_date: str, end_date: str, user_id: str = None, refresh: bool = False,
+             series: dict = None, layout: str = None, known_hashes: dict = None) -> dict:
+    """Sync all data types for a date range (columnar with `layout="columnar"`)."""
     try:
-        client = get_client(user_id)
         results = {
             "success": True,
             "dates": {}
         }
 
-        current = date.fromisoformat(start_date)
-        end = date.fromisoformat(end_date)
-
-        while current <= end:
-            date_str = current.isoformat()
-            day_data = {
-                "sleep": None,
-                "activity": None,
-                "stress": None,
-                "bodyBattery": None,
-                "heartRate": None
-            }
+        for date_str, day_data, _ in iter_sync_days(start_date, end_date, user_id, refresh,
+                                                    series=series, known_hashes=known_hashes):
+            results["dates"][date_str] = day_data
 
-            try:
-                sleep_raw = client.get_sleep_data(date_str)
-                sleep_result = depersonalize_sleep(sleep_raw)
-
-                # Add HR during sleep
-                try:
-                    hr_data = client.get_heart_rates(date_str)
-                    hr_values = hr_data.get('heartRateValues', [])
-                    sleep_start = sleep_result.get('sleepStartTimestampGMT')
-                    sleep_end = sleep_result.get('sleepEndTimestampGMT')
-
-                    if hr_values and sleep_start and sleep_end:
-                        sleep_hr = [v[1] for v in hr_values if v[0] and sleep_start <= v[0] <= sleep_end and v[1]]
-                        if sleep_hr:
-                            sleep_result['avgSleepHR'] = round(sum(sleep_hr) / len(sleep_hr))
-                except Exception:
-                    pass
-
-                # Add SpO2 if available
-                try:
-                    spo2_data = client.get_spo2_data(date_str)
-                    avg_spo2 = spo2_data.get('avgSleepSpO2') or spo2_data.get('averageSpO2')
-                    if avg_spo2:
-                        sleep_result['averageSpO2Value'] = avg_spo2
-                except Exception:
-                    pass
-
-                day_data["sleep"] = sleep_result
-            except Exception as e:
-                day_data["sleepError"] = str(e)
+        if layout == COLUMNAR:
+            return sync_columnar(results["dates"])
+        return results
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
-            try:
-                activity_raw = client.get_user_summary(date_str)
-                day_data["activity"] = depersonalize_activity(activity_raw)
-            except Exception as e:
-                day_data["activityError"] = str(e)
 
-            try:
-                stress_raw = client.get_stress_data(date_str)
-                day_data["stress"] = depersonalize_stress(stress_raw)
-            except Exception as e:
-                day_data["stressError"] = str(e)
+def stream_sync_all(start_date: str, end_date: str, user_id: str = None, refresh: bool = False,
+                    series: dict = None, known_hashes: dict = None):
+    """Streaming form of sync_all for NDJSON output.
 
-            try:
-                bb_raw = client.get_body_battery(date_str)
-                day_data["bodyBattery"] = depersonalize_body_battery(bb_raw)
-            except Exception as e:
-                day_data["bodyBatteryError"] = str(e)
+    Yields {"date", "data"} for each completed day in order, then a final
+    {"success": True, "done": True, "days": n} record, or
+    {"success": False, "error": ...} if the sync fails part way.
+    """
+    days = 0
+    try:
+        for date_str, day_data, _ in iter_sync_days(start_date, end_date, user_id, refresh,
+                                                    series=series, known_hashes=known_hashes):
+            days += 1
+            yield {"date": date_str, "data": day_data}
+        yield {"success": True, "done": True, "days": days}
+    except Exception as e:
+        yield {"success": False, "error": str(e)}
 
-            try:
-                hr_raw = client.get_heart_rates(date_str)
-                day_data["heartRate"] = depersonalize_heart_rate(hr_raw)
-            except Exception as e:
-                day_data["heartRateError"] = str(e)
 
+def sync_incremental(user_id: str = None, start_date: str = None, end_date: str = None,
+                     refresh: bool = False, series: dict = None, known_hashes: dict = None) -> dict:
+    """Sync only the days each metric still needs, based on stored watermarks.
+
+    Days after a metric's watermark are fetched; finalized, gap-free days
+    then advance it. A day Garmin has no data for (see has_data) only
+    advances it once it is EMPTY_DAY_GRACE_DAYS old, since the device may
+    not have uploaded it yet. With no watermarks yet the sync starts at `start_date`
+    (default: INCREMENTAL_LOOKBACK_DAYS ago). Returns the usual per-day
+    `dates` plus the updated `watermarks`, saved as each day completes so
+    an interrupted sync resumes where it stopped.
+    """
+    try:
+        tokenstore = get_tokenstore(user_id)
+        marks = load_watermarks(tokenstore)
+        end_date = end_date or date.today().isoformat()
+
+        default_start = start_date or (date.today() - timedelta(days=INCREMENTAL_LOOKBACK_DAYS)).isoformat()
+        start = min(
+            next_day(marks[metric]) if marks.get(metric) else default_start
+            for metric in SYNC_METRICS
+        )
+
+        def metrics_for(date_str):
+            return [m for m in SYNC_METRICS if needs_sync(marks, m, date_str)]
+
+        settled_before = (date.today() - timedelta(days=EMPTY_DAY_GRACE_DAYS)).isoformat()
+
+        results = {
+            "success": True,
+            "dates": {},
+            "range": {"start_date": start, "end_date": end_date},
+        }
+
+        for date_str, day_data, measured in iter_sync_days(start, end_date, user_id, refresh, metrics_for,
+                                                           series, known_hashes):
             results["dates"][date_str] = day_data
-            current += timedelta(days=1)
 
+            moved = False
+            if is_finalized(date_str):
+                # Failed metrics have no hash; ones without data wait out the grace period
+                hashes = day_data["hashes"]
+                settled = date_str < settled_before
+                for metric in metrics_for(date_str):
+                    if metric in hashes and (settled or metric in measured):
+                        moved = advance(marks, metric, date_str, start) or moved
+            if moved:
+                marks = save_watermarks(tokenstore, marks)
+
+        results["watermarks"] = marks
         return results
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No command specified"}))
-        sys.exit(1)
+def fetch_aggregates(user_id: str = None) -> dict:
+    """Rolling aggregates (see aggregates.py) as of the last synced day; no Garmin calls."""
+    try:
+        return {"success": True, "data": load_aggregates(get_tokenstore(user_id)).summary()}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 
-    command = sys.argv[1]
-    args = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+def command_table(args: dict) -> tuple:
+    """Map command names to callables for the given arguments.
 
+    Returns (commands, stream_commands); stream commands return an
+    iterator of records instead of a single result.
+    """
     user_id = args.get("user_id")
+    refresh = bool(args.get("refresh"))
+    series = series_options(args)
+    window_days = window_days_option(args)
+    known_hashes = args.get("known_hashes")
 
     commands = {
         "authenticate": lambda: authenticate(args.get("email", ""), args.get("password", ""), user_id),
         "check_auth": lambda: check_auth(user_id),
-        "fetch_sleep": lambda: fetch_sleep_data(args.get("date", ""), user_id),
-        "fetch_activity": lambda: fetch_activity_summary(args.get("date", ""), user_id),
-        "fetch_stress": lambda: fetch_stress_data(args.get("date", ""), user_id),
-        "fetch_body_battery": lambda: fetch_body_battery(args.get("date", ""), user_id),
-        "fetch_heart_rate": lambda: fetch_heart_rate(args.get("date", ""), user_id),
-        "fetch_activities": lambda: fetch_activities(args.get("date", ""), user_id),
-        "fetch_activities_batch": lambda: fetch_activities_batch(args.get("start_date", ""), args.get("end_date", ""), user_id),
-        "sync_all": lambda: sync_all(args.get("start_date", ""), args.get("end_date", ""), user_id),
+        "fetch_sleep": lambda: fetch_sleep_data(args.get("date", ""), user_id, refresh),
+        "fetch_activity": lambda: fetch_activity_summary(args.get("date", ""), user_id, refresh),
+        "fetch_stress": lambda: fetch_stress_data(args.get("date", ""), user_id, refresh),
+        "fetch_body_battery": lambda: fetch_body_battery(args.get("date", ""), user_id, refresh),
+        "fetch_heart_rate": lambda: fetch_heart_rate(args.get("date", ""), user_id, refresh, series),
+        "fetch_activities": lambda: fetch_activities(args.get("date", ""), user_id, refresh),
+        "fetch_activities_batch": lambda: fetch_activities_batch(args.get("start_date", ""), args.get("end_date", ""), user_id, refresh, args.get("layout")),
+        "sync_all": lambda: sync_all(args.get("start_date", ""), args.get("end_date", ""), user_id, refresh, series, args.get("layout"), known_hashes),
+        "fetch_aggregates": lambda: fetch_aggregates(user_id),
+        "sync_incremental": lambda: sync_incremental(user_id, args.get("start_date"), args.get("end_date"), refresh, series, known_hashes),
+    }
+
+    # Commands that print one JSON object per line as results become available
+    stream_commands = {
+        "sync_all_stream": lambda: stream_sync_all(args.get("start_date", ""), args.get("end_date", ""), user_id, refresh, series, known_hashes),
+        "import_activities": lambda: stream_activity_history(args.get("start_date", ""), args.get("end_date", ""), user_id, refresh,
+                                                             bool(args.get("resume", True)), window_days),
     }
 
+    return commands, stream_commands
+
+
+# Commands whose upstream calls run in the bulk lane (see scheduler.py)
+BULK_COMMANDS = {"fetch_activities_batch", "import_activities", "sync_all", "sync_all_stream", "sync_incremental"}
+
+# Requests a `serve` worker handles concurrently
+SERVE_WORKERS = int(os.environ.get("GARMIN_SERVE_WORKERS", "8"))
+
+
+def serve(stdin=None, stdout=None):
+    """Long-running worker mode: line-delimited JSON-RPC over stdin/stdout.
+
+    Each request line is {"jsonrpc": "2.0", "id": ..., "method": <command>,
+    "params": {...}} using the same commands as the CLI. Requests run
+    concurrently and are answered by id with {"id", "result"} or
+    {"id", "error": {"code", "message"}}. Stream commands first send one
+    {"id", "partial": record} line per record, then {"id", "result": null}.
+    Clients, caches and sessions stay warm between requests. Exits when
+    stdin closes, after in-flight requests finish.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    write_lock = threading.Lock()
+
+    def send(message: dict):
+        line = dumps_json({"jsonrpc": "2.0", **message}).decode()
+        with write_lock:
+            stdout.write(line + "\n")
+            stdout.flush()
+
+    def handle(request):
+        # Every request gets a reply, or the caller waits for it forever
+        if not isinstance(request, dict):
+            send({"id": None, "error": {"code": -32600, "message": "Invalid request: expected a JSON object"}})
+            return
+        request_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params") or {}
+        try:
+            if not isinstance(params, dict):
+                raise ValueError("expected a JSON object")
+            commands, stream_commands = command_table(params)
+        except Exception as e:
+            send({"id": request_id, "error": {"code": -32602, "message": f"Invalid params: {e}"}})
+            return
+
+        current_lane.set(BULK if method in BULK_COMMANDS else INTERACTIVE)
+        try:
+            if method in stream_commands:
+                for record in stream_commands[method]():
+                    send({"id": request_id, "partial": record})
+                send({"id": request_id, "result": None})
+            elif method in commands:
+                send({"id": request_id, "result": commands[method]()})
+            else:
+                send({"id": request_id, "error": {"code": -32601, "message": f"Unknown command: {method}"}})
+        except Exception as e:
+            send({"id": request_id, "error": {"code": -32000, "message": str(e)}})
+
+    with ThreadPoolExecutor(max_workers=SERVE_WORKERS) as pool:
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                send({"id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}})
+                continue
+            pool.submit(handle, request)
+
+
+def write_output(record, media_type: str = JSON):
+    """Write one result to stdout: a JSON line, or a MessagePack object."""
+    if media_type == JSON:
+        sys.stdout.write(dumps_json(record).decode() + "\n")
+    else:
+        sys.stdout.buffer.write(encode(record, media_type))
+    sys.stdout.flush()
+
+
+def main():
+    argv = sys.argv[1:]
+    # --format msgpack: binary output (stream commands write one object per record)
+    media_type = JSON
+    if "--format" in argv[:-1]:
+        i = argv.index("--format")
+        media_type = MSGPACK if argv[i + 1] == "msgpack" else JSON
+        del argv[i:i + 2]
+        if media_type not in MEDIA_TYPES:
+            print(json.dumps({"error": "msgpack output needs the msgpack package"}))
+            sys.exit(1)
+
+    if not argv:
+        print(json.dumps({"error": "No command specified"}))
+        sys.exit(1)
+
+    command = argv[0]
+    if command == "serve":
+        serve()
+        return
+
+    args = json.loads(argv[1]) if len(argv) > 1 else {}
+    try:
+        commands, stream_commands = command_table(args)
+    except InvalidOptions as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+    if command in stream_commands:
+        for record in stream_commands[command]():
+            write_output(record, media_type)
+        return
+
     if command not in commands:
         print(json.dumps({"error": f"Unknown command: {command}"}))
         sys.exit(1)
 
-    result = commands[command]()
-    print(json.dumps(result))
+    write_output(commands[command](), media_type)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for the hosted service (Procfile / railway.json).
+
+With preloading on (the default), the master imports app.py and warms the
+lazily imported garminconnect once, then forks workers that share it.
+Nothing process-bound exists yet at that point: job threads, pooled
+sessions and caches are created on first use in each worker. With
+preloading off, every worker imports and warms up on its own before it
+starts serving.
+"""
+import os
+import random
+
+# Address to listen on; Railway/Render set PORT
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+worker_class = "gthread"
+
+# Worker processes (gunicorn's own WEB_CONCURRENCY convention)
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# Request threads per worker
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Import the app in the master and fork warmed workers ("false" to import per worker)
+preload_app = os.environ.get("GARMIN_PRELOAD", "true").lower() != "false"
+
+
+def _warm_up():
+    import garmin_service
+
+    garmin_service.warm_up()
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before any fork
+    if preload_app:
+        _warm_up()
+
+
+def post_fork(server, worker):
+    # Forked workers inherit the master's random state; retry jitter shouldn't match
+    random.seed()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up()
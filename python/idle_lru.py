@@ -0,0 +1,61 @@
+"""
+Per-user state that is forgotten once the user goes idle.
+
+Rate-limit buckets, fan-out slots and cache handles are created on a
+user's first call. In hosted mode the set of users only grows, so like the
+session pool these maps drop entries unused for POOL_IDLE_TTL seconds and
+keep at most POOL_MAX_SIZE, least recently used first. Entries still in use
+are kept either way, since a fresh replacement would not share their state.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from session_pool import POOL_IDLE_TTL, POOL_MAX_SIZE
+
+
+class IdleLRU:
+    """Map of key -> factory(key), evicting idle and least recently used entries.
+
+    `in_use(value)` tells whether an entry must be kept regardless of age,
+    e.g. while calls are holding it.
+    """
+
+    def __init__(self, factory, max_size: int = POOL_MAX_SIZE, idle_ttl: float = POOL_IDLE_TTL,
+                 in_use=None):
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._in_use = in_use or (lambda value: False)
+        self._entries = OrderedDict()  # key -> [value, last_used]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The value for `key`, created if missing, marked as just used."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [self._factory(key), now]
+            else:
+                entry[1] = now
+                self._entries.move_to_end(key)
+            self._evict(now, key)
+            return entry[0]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now: float, current):
+        # Kept in LRU order, so stale entries are at the front
+        for _ in range(len(self._entries)):
+            key, entry = next(iter(self._entries.items()))
+            fits = len(self._entries) <= self.max_size
+            if key == current or (fits and now - entry[1] <= self.idle_ttl):
+                break
+            if self._in_use(entry[0]):
+                # Still held, which counts as being used
+                entry[1] = now
+                self._entries.move_to_end(key)
+            else:
+                del self._entries[key]
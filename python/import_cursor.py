@@ -0,0 +1,43 @@
+"""
+Resume point of a user's full-history activity import.
+
+The cursor records the range being imported and the last day delivered,
+so an interrupted import of the same range continues after it. It is
+stored as JSON next to the user's tokens and removed once the import
+finishes.
+"""
+import json
+import os
+from pathlib import Path
+
+from atomic_json import atomic_write_json
+
+CURSOR_FILE = "activity_import.json"
+
+
+def load_cursor(tokenstore: str) -> dict:
+    """The saved cursor, empty if no import is in progress."""
+    try:
+        with open(Path(tokenstore) / CURSOR_FILE) as f:
+            cursor = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cursor if isinstance(cursor, dict) else {}
+
+
+def save_cursor(tokenstore: str, cursor: dict):
+    atomic_write_json(Path(tokenstore) / CURSOR_FILE, cursor)
+
+
+def clear_cursor(tokenstore: str):
+    try:
+        os.remove(Path(tokenstore) / CURSOR_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def resume_point(cursor: dict, start_date: str, end_date: str):
+    """Last delivered day of an unfinished import of exactly this range, else None."""
+    if cursor.get("start_date") == start_date and cursor.get("end_date") == end_date:
+        return cursor.get("through")
+    return None
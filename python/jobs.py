@@ -0,0 +1,378 @@
+"""
+Background jobs for long-running Garmin syncs.
+
+Submitting a job stores it in a SQLite database and returns its id right
+away; a fixed number of worker threads in the submitting process run it and
+record progress and the final result, which any process sharing the
+database can read. Workers take queued jobs round-robin by user, so a batch
+covering many users makes progress for all of them. Jobs whose process died
+before they finished are marked interrupted.
+"""
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from garmin_service import (
+    IMPORT_WINDOW_DAYS,
+    date_range,
+    fetch_activities_batch,
+    session_key,
+    stream_activity_history,
+    stream_sync_all,
+    sync_columnar,
+    sync_incremental,
+)
+from projections import COLUMNAR
+from range_fetch import date_windows
+from scheduler import BULK, FairQueue, current_lane
+
+# SQLite file holding job state and results
+JOBS_DB = os.environ.get("GARMIN_JOBS_DB", str(Path.home() / ".garminconnect-jobs.sqlite3"))
+
+# Jobs one process runs at the same time; the rest wait in the queue (also the
+# number of users a batch syncs concurrently)
+JOB_WORKERS = int(os.environ.get("GARMIN_JOB_WORKERS", "2"))
+
+# Seconds finished jobs (and their results) are kept
+JOB_RETENTION = float(os.environ.get("GARMIN_JOB_RETENTION", "86400"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+logger = logging.getLogger("garmin_service.jobs")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER,
+    error TEXT,
+    result TEXT,
+    pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    batch_id TEXT
+)
+"""
+
+# Columns added after the first release of the table
+MIGRATIONS = (
+    ("batch_id", "ALTER TABLE jobs ADD COLUMN batch_id TEXT"),
+)
+
+
+def run_sync_all(params: dict, progress) -> dict:
+    """sync_all as a job, reporting one step per completed day."""
+    start_date = params.get("start_date", "")
+    end_date = params.get("end_date", "")
+    progress(0, sum(1 for _ in date_range(start_date, end_date)))
+
+    result = {"success": True, "dates": {}}
+    for record in stream_sync_all(start_date, end_date, params.get("user_id"),
+                                  bool(params.get("refresh")), params.get("series"), params.get("known_hashes")):
+        if "date" in record:
+            result["dates"][record["date"]] = record["data"]
+            progress(len(result["dates"]))
+        elif not record.get("success"):
+            return record
+    if params.get("layout") == COLUMNAR:
+        return sync_columnar(result["dates"])
+    return result
+
+
+def run_activities_batch(params: dict, progress) -> dict:
+    progress(0, 1)
+    result = fetch_activities_batch(params.get("start_date", ""), params.get("end_date", ""),
+                                    params.get("user_id"), bool(params.get("refresh")), params.get("layout"))
+    progress(1)
+    return result
+
+
+def run_sync_incremental(params: dict, progress) -> dict:
+    progress(0, 1)
+    result = sync_incremental(params.get("user_id"), params.get("start_date"), params.get("end_date"),
+                              bool(params.get("refresh")), params.get("series"), params.get("known_hashes"))
+    progress(1)
+    return result
+
+
+def run_activities_import(params: dict, progress) -> dict:
+    """stream_activity_history as a job, reporting one step per window of the range."""
+    start_date = params.get("start_date", "")
+    end_date = params.get("end_date", "")
+    window_days = int(params.get("window_days") or IMPORT_WINDOW_DAYS)
+    windows = [last for _, last in date_windows(start_date, end_date, window_days)]
+    progress(0, len(windows))
+
+    result = {"success": True, "data": {}}
+    for record in stream_activity_history(start_date, end_date, params.get("user_id"),
+                                          bool(params.get("refresh")), params.get("resume", True), window_days):
+        if "window" in record:
+            for day, activities in record["data"].items():
+                result["data"].setdefault(day, []).extend(activities)
+            progress(sum(1 for last in windows if last <= record["window"]["end_date"]))
+        elif not record.get("success"):
+            return record
+        else:
+            result["activities"] = record["activities"]
+            result["resumedFrom"] = record["resumedFrom"]
+    return result
+
+
+JOB_KINDS = {
+    "sync_all": run_sync_all,
+    "sync_incremental": run_sync_incremental,
+    "activities_batch": run_activities_batch,
+    "activities_import": run_activities_import,
+}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobQueue:
+    """SQLite-backed job store with local worker threads."""
+
+    def __init__(self, db_path: str = JOBS_DB, workers: int = JOB_WORKERS, kinds: dict = None):
+        self.db_path = db_path
+        self.workers = workers
+        self.kinds = kinds or JOB_KINDS
+        self._queue = FairQueue()
+        self._ready = False
+        self._active = set()  # ids of jobs queued or running in this process
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _setup(self):
+        """Create the schema and start the workers on first use."""
+        with self._lock:
+            if self._ready:
+                return
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(SCHEMA)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+                for column, statement in MIGRATIONS:
+                    if column not in columns:
+                        conn.execute(statement)
+            for i in range(max(1, self.workers)):
+                threading.Thread(target=self._work, name=f"garmin-job-{i}", daemon=True).start()
+            self._ready = True
+        self._mark_interrupted()
+
+    def _mark_interrupted(self):
+        """Fail jobs left unfinished by processes that no longer exist."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, pid FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            dead = [row["id"] for row in rows if not self._owner_alive(row)]
+            for job_id in dead:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (INTERRUPTED, "Worker exited before the job finished", time.time(), job_id),
+                )
+
+    def _owner_alive(self, row: sqlite3.Row) -> bool:
+        if row["pid"] == os.getpid():
+            # Same pid but not ours: a previous process that had the same pid
+            return row["id"] in self._active
+        return bool(row["pid"]) and _pid_alive(row["pid"])
+
+    def _purge(self, conn: sqlite3.Connection):
+        conn.execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - JOB_RETENTION,),
+        )
+
+    def submit(self, kind: str, params: dict, batch_id: str = None) -> dict:
+        """Queue a job and return its status."""
+        if kind not in self.kinds:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._setup()
+
+        job_id = uuid.uuid4().hex
+        self._active.add(job_id)
+        with self._connect() as conn:
+            self._purge(conn)
+            conn.execute(
+                "INSERT INTO jobs (id, kind, user_id, params, status, pid, created_at, batch_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, params.get("user_id"), json.dumps(params), QUEUED,
+                 os.getpid(), time.time(), batch_id),
+            )
+        run = contextvars.copy_context().run
+        self._queue.put(session_key(params.get("user_id")), (run, job_id, kind, params))
+        return self.status(job_id)
+
+    def submit_batch(self, kind: str, user_ids: list, params: dict) -> dict:
+        """Queue one job of `kind` per user, sharing `params`; returns the batch status."""
+        batch_id = uuid.uuid4().hex
+        for user_id in dict.fromkeys(user_ids):
+            self.submit(kind, {**params, "user_id": user_id}, batch_id)
+        return self.batch_status(batch_id)
+
+    def _work(self):
+        while True:
+            run, job_id, kind, params = self._queue.get()
+            try:
+                run(self._run, job_id, kind, params)
+            except Exception as e:
+                # e.g. "database is locked" while recording the job; the worker must survive it
+                logger.exception("job %s (%s) failed outside the job function", job_id, kind)
+                self._fail(job_id, e)
+            finally:
+                self._active.discard(job_id)
+
+    def _fail(self, job_id: str, error: Exception):
+        try:
+            self._update(job_id, status=FAILED, error=str(error), finished_at=time.time())
+        except Exception:
+            # No longer in _active, so reading the job marks it interrupted instead
+            logger.exception("could not mark job %s failed", job_id)
+
+    def _update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id: str, kind: str, params: dict):
+        current_lane.set(BULK)
+        self._update(job_id, status=RUNNING, started_at=time.time())
+
+        def progress(done: int, total: int = None):
+            if total is None:
+                self._update(job_id, progress_done=done)
+            else:
+                self._update(job_id, progress_done=done, progress_total=total)
+
+        try:
+            result = self.kinds[kind](params, progress)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        succeeded = bool(result.get("success"))
+        self._update(
+            job_id,
+            status=SUCCEEDED if succeeded else FAILED,
+            error=None if succeeded else result.get("error"),
+            result=json.dumps(result),
+            finished_at=time.time(),
+        )
+
+    def _row(self, job_id: str):
+        self._setup()
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row["status"] in (QUEUED, RUNNING) and not self._owner_alive(row):
+            self._mark_interrupted()
+            return self._row(job_id)
+        return row
+
+    def batch_status(self, batch_id: str) -> dict:
+        """Aggregate status of a batch with an ETA, or None if unknown."""
+        self._setup()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at", (batch_id,)).fetchall()
+        if not rows:
+            return None
+
+        counts = {}
+        for row in rows:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        finished = [row for row in rows if row["finished_at"] is not None]
+        started = [row["started_at"] for row in rows if row["started_at"] is not None]
+        remaining = len(rows) - len(finished)
+
+        eta = None
+        if finished and remaining:
+            # Throughput so far, assuming the same parallelism for the rest
+            elapsed = time.time() - min(started)
+            eta = round(elapsed / len(finished) * remaining, 1)
+
+        return {
+            "id": batch_id,
+            "kind": rows[0]["kind"],
+            "users": len(rows),
+            "statuses": counts,
+            "progress": {"done": len(finished), "total": len(rows)},
+            "etaSeconds": 0 if not remaining else eta,
+            "startedAt": min(started) if started else None,
+            "finishedAt": max(row["finished_at"] for row in finished) if not remaining else None,
+            "jobs": [{"userId": row["user_id"], "jobId": row["id"]} for row in rows],
+        }
+
+    def backlog(self) -> dict:
+        """Jobs waiting in this process by user, and job counts by status overall."""
+        self._setup()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        queued = self._queue.backlog()
+        return {
+            "workers": self.workers,
+            "queued": sum(queued.values()),
+            "queuedByUser": queued,
+            "statuses": {row["status"]: row["n"] for row in rows},
+        }
+
+    def status(self, job_id: str) -> dict:
+        """Job status and progress without the result, or None if unknown."""
+        row = self._row(job_id)
+        return _job_status(row) if row is not None else None
+
+    def result(self, job_id: str) -> tuple:
+        """(status, result); result is None until the job has finished."""
+        row = self._row(job_id)
+        if row is None:
+            return None, None
+        return _job_status(row), json.loads(row["result"]) if row["result"] else None
+
+
+def _job_status(row: sqlite3.Row) -> dict:
+    done, total = row["progress_done"], row["progress_total"]
+    eta = None
+    if row["status"] == RUNNING and done and total:
+        eta = round((time.time() - row["started_at"]) / done * (total - done), 1)
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": {"done": done, "total": total},
+        "etaSeconds": eta,
+        "batchId": row["batch_id"],
+        "error": row["error"],
+        "createdAt": row["created_at"],
+        "startedAt": row["started_at"],
+        "finishedAt": row["finished_at"],
+    }
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Garmin HTTP service (app.py).
+
+Simulates concurrent users that authenticate once and then send a weighted
+mix of /sleep, /heart-rate, /activities-batch and /sync-all requests for
+recent dates. It reports throughput, errors and latency percentiles plus
+a histogram per endpoint. Pass several user counts to step the load and
+find where p99 latency starts to climb.
+
+Start the service against the stub backend first, from python/:
+
+    GARMIN_CLIENT_FACTORY=loadtest.stub_garmin:StubGarmin \\
+        gunicorn app:app --bind 127.0.0.1:5000 --worker-class gthread --threads 4
+
+then:
+
+    python loadtest/run.py --users 5,10,20,40 --duration 30
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+# Default request mix: mostly interactive reads, some batch and sync traffic
+DEFAULT_MIX = "sleep=45,heart-rate=30,activities-batch=15,sync-all=10"
+
+# Upper bounds (ms) of the latency histogram buckets
+HISTOGRAM_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def recent_day(rng: random.Random, max_age_days: int) -> date:
+    return date.today() - timedelta(days=rng.randint(0, max_age_days))
+
+
+def build_request(endpoint: str, user_id: str, rng: random.Random, args) -> dict:
+    """JSON body for one request to `endpoint`."""
+    body = {"user_id": user_id}
+    if rng.random() < args.refresh_rate:
+        body["refresh"] = True
+
+    if endpoint in ("sleep", "heart-rate"):
+        body["date"] = recent_day(rng, args.max_age_days).isoformat()
+        if endpoint == "heart-rate":
+            body.update({"hr_format": "compact", "max_points": 300})
+    elif endpoint == "activities-batch":
+        end = recent_day(rng, args.max_age_days)
+        body["start_date"] = (end - timedelta(days=args.batch_days - 1)).isoformat()
+        body["end_date"] = end.isoformat()
+    elif endpoint == "sync-all":
+        end = recent_day(rng, args.max_age_days)
+        body["start_date"] = (end - timedelta(days=args.sync_days - 1)).isoformat()
+        body["end_date"] = end.isoformat()
+    return body
+
+
+def post(url: str, body: dict, api_key: str, timeout: float) -> tuple:
+    """(error, latency in seconds); error is None for HTTP 2xx without {"success": false}."""
+    data = json.dumps(body).encode()
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    request = urllib.request.Request(url, data=data, headers=headers, method="POST")
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read() or b"{}")
+        error = payload.get("error", "failed") if payload.get("success") is False else None
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        error = str(e)
+    return error, time.perf_counter() - start
+
+
+class Recorder:
+    """Thread-safe latency and error collection per endpoint."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, error: str, latency: float):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                self.error_samples.setdefault(endpoint, error)
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def histogram(latencies: list) -> list:
+    """[(bound_ms, count)] with a final (None, count) bucket for slower calls."""
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        ms = latency * 1000
+        index = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if ms <= bound), len(HISTOGRAM_BOUNDS_MS))
+        counts[index] += 1
+    return list(zip(HISTOGRAM_BOUNDS_MS + (None,), counts))
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+        "p90_ms": round(percentile(ordered, 0.90) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1) if ordered else 0.0,
+        "histogram": [{"le_ms": bound, "count": count} for bound, count in histogram(ordered)],
+    }
+
+
+def virtual_user(index: int, args, mix: dict, recorder: Recorder, stop: threading.Event):
+    rng = random.Random(f"{args.seed}-{index}")
+    user_id = f"loadtest-{index}"
+    endpoints, weights = list(mix), list(mix.values())
+
+    # With the stub backend this just writes placeholder tokens
+    post(f"{args.url}/authenticate", {"email": f"{user_id}@example.com", "password": "x", "user_id": user_id},
+         args.api_key, args.timeout)
+
+    while not stop.is_set():
+        endpoint = rng.choices(endpoints, weights)[0]
+        error, latency = post(f"{args.url}/{endpoint}", build_request(endpoint, user_id, rng, args),
+                              args.api_key, args.timeout)
+        recorder.record(endpoint, error, latency)
+        if args.think_time:
+            stop.wait(rng.expovariate(1 / args.think_time))
+
+
+def run_level(users: int, args, mix: dict) -> dict:
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=virtual_user, args=(i, args, mix, recorder, stop), daemon=True)
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(args.timeout)
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [latency for values in recorder.latencies.values() for latency in values]
+    return {
+        "users": users,
+        "duration_s": round(elapsed, 1),
+        "total": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        "endpoints": {
+            endpoint: summarize(values, recorder.errors.get(endpoint, 0), elapsed)
+            for endpoint, values in sorted(recorder.latencies.items())
+        },
+        "error_samples": recorder.error_samples,
+    }
+
+
+def print_level(result: dict, show_histogram: bool):
+    print(f"\n== {result['users']} users, {result['duration_s']}s")
+    print(f"{'endpoint':18s} {'reqs':>7s} {'err':>5s} {'rps':>8s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'max':>9s}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(f"{name:18s} {s['requests']:7d} {s['errors']:5d} {s['throughput_rps']:8.2f} "
+              f"{s['p50_ms']:7.1f}ms {s['p90_ms']:7.1f}ms {s['p99_ms']:7.1f}ms {s['max_ms']:7.1f}ms")
+    for name, error in result["error_samples"].items():
+        print(f"  {name} error: {error}")
+    if show_histogram:
+        for name, s in rows:
+            buckets = " ".join(
+                f"{'<=' + str(b['le_ms']) if b['le_ms'] else '>' + str(HISTOGRAM_BOUNDS_MS[-1])}:{b['count']}"
+                for b in s["histogram"] if b["count"]
+            )
+            print(f"  {name:16s} {buckets}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--api-key", default=os.environ.get("GARMIN_SERVICE_API_KEY", ""))
+    parser.add_argument("--users", default="10", help="concurrent users; comma-separated to step the load")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per load level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between a user's requests (s)")
+    parser.add_argument("--max-age-days", type=int, default=90, help="requested dates are at most this old")
+    parser.add_argument("--sync-days", type=int, default=7, help="days per /sync-all request")
+    parser.add_argument("--batch-days", type=int, default=30, help="days per /activities-batch request")
+    parser.add_argument("--refresh-rate", type=float, default=0.0, help="fraction of requests that bypass the cache")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", default="loadtest")
+    parser.add_argument("--histogram", action="store_true", help="print latency histograms")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+
+    mix = parse_mix(args.mix)
+    results = []
+    for users in (int(u) for u in args.users.split(",")):
+        result = run_level(users, args, mix)
+        print_level(result, args.histogram)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mix": mix, "levels": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
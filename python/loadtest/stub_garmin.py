@@ -0,0 +1,159 @@
+"""
+Stand-in for garminconnect.Garmin used by load tests.
+
+Serves the synthetic payloads from benchmarks/fixtures.py with a
+configurable latency and failure mix, without any network access. Point
+the service at it with
+
+    GARMIN_CLIENT_FACTORY=loadtest.stub_garmin:StubGarmin
+
+(run from the python/ directory). Failures look like garth HTTP errors, so
+the service's retry and rate-limit handling reacts as it would to Garmin.
+"""
+import json
+import os
+import random
+import threading
+import time
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks import fixtures
+
+# Mean upstream latency and its +/- uniform jitter, in milliseconds
+STUB_LATENCY_MS = float(os.environ.get("STUB_GARMIN_LATENCY_MS", "150"))
+STUB_JITTER_MS = float(os.environ.get("STUB_GARMIN_JITTER_MS", "50"))
+
+# Fraction of calls failing with a 5xx, and with a 429 (Retry-After: STUB_RETRY_AFTER)
+STUB_ERROR_RATE = float(os.environ.get("STUB_GARMIN_ERROR_RATE", "0"))
+STUB_429_RATE = float(os.environ.get("STUB_GARMIN_429_RATE", "0"))
+STUB_RETRY_AFTER = os.environ.get("STUB_GARMIN_RETRY_AFTER", "1")
+
+_rng = random.Random(os.environ.get("STUB_GARMIN_SEED"))
+_rng_lock = threading.Lock()
+
+
+class StubHTTPError(Exception):
+    """Shaped like garth's HTTP errors: the status is on `.response`."""
+
+    def __init__(self, status: int, headers: dict = None):
+        super().__init__(f"Stub Garmin returned {status}")
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+def _upstream():
+    """Sleep for one simulated round trip, then maybe fail."""
+    with _rng_lock:
+        delay = max(0.0, STUB_LATENCY_MS + _rng.uniform(-STUB_JITTER_MS, STUB_JITTER_MS)) / 1000
+        roll = _rng.random()
+    time.sleep(delay)
+    if roll < STUB_429_RATE:
+        raise StubHTTPError(429, {"Retry-After": STUB_RETRY_AFTER})
+    if roll < STUB_429_RATE + STUB_ERROR_RATE:
+        raise StubHTTPError(503)
+
+
+def _seed(day: str) -> int:
+    return date.fromisoformat(day).toordinal()
+
+
+# Payload generation is CPU work the real Garmin doesn't do on our side
+@lru_cache(maxsize=512)
+def _heart_rate(day: str) -> dict:
+    return fixtures.heart_rate_day(day, seed=_seed(day))
+
+
+@lru_cache(maxsize=512)
+def _sleep(day: str) -> dict:
+    return fixtures.sleep_day(day, seed=_seed(day))
+
+
+@lru_cache(maxsize=512)
+def _summary(day: str) -> dict:
+    return fixtures.user_summary_day(day, seed=_seed(day))
+
+
+@lru_cache(maxsize=512)
+def _body_battery(start: str, days: int) -> list:
+    return fixtures.body_battery_range(start, days=days, seed=_seed(start))
+
+
+@lru_cache(maxsize=128)
+def _activities(start: str, days: int) -> list:
+    return fixtures.activities_year(start, days=days, seed=_seed(start))
+
+
+def _days(start: str, end: str = None) -> int:
+    return (date.fromisoformat(end or start) - date.fromisoformat(start)).days + 1
+
+
+class _StubToken:
+    expired = False
+
+
+class _StubGarth:
+    oauth2_token = _StubToken()
+
+    def dump(self, tokenstore: str):
+        path = Path(tokenstore)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ("oauth1_token.json", "oauth2_token.json"):
+            (path / name).write_text(json.dumps({"stub": True}))
+
+    def refresh_oauth2(self):
+        _upstream()
+
+
+class StubGarmin:
+    """Implements the subset of garminconnect.Garmin the service calls."""
+
+    def __init__(self, email: str = None, password: str = None, **kwargs):
+        self.garth = _StubGarth()
+
+    def login(self, tokenstore: str = None):
+        # A token login costs two round trips on the real client
+        _upstream()
+        _upstream()
+
+    def get_full_name(self) -> str:
+        return "Stub User"
+
+    def get_sleep_data(self, cdate: str) -> dict:
+        _upstream()
+        return _sleep(cdate)
+
+    def get_spo2_data(self, cdate: str) -> dict:
+        _upstream()
+        return {"calendarDate": cdate, "averageSpO2": 95.0, "avgSleepSpO2": 94.0, "lowestSpO2": 88}
+
+    def get_heart_rates(self, cdate: str) -> dict:
+        _upstream()
+        return _heart_rate(cdate)
+
+    def get_user_summary(self, cdate: str) -> dict:
+        _upstream()
+        return _summary(cdate)
+
+    def get_stress_data(self, cdate: str) -> dict:
+        _upstream()
+        return {
+            "calendarDate": cdate,
+            "overallStressLevel": 30,
+            "restStressDuration": 28000,
+            "activityStressDuration": 9000,
+            "lowStressDuration": 18000,
+            "mediumStressDuration": 9000,
+            "highStressDuration": 3000,
+            "stressQualifier": "BALANCED",
+        }
+
+    def get_body_battery(self, startdate: str, enddate: str = None) -> list:
+        _upstream()
+        return _body_battery(startdate, _days(startdate, enddate))
+
+    def get_activities_by_date(self, startdate: str, enddate: str = None, *args, **kwargs) -> list:
+        _upstream()
+        return _activities(startdate, _days(startdate, enddate))
+
@@ -0,0 +1,181 @@
+"""
+Process-local metrics in the Prometheus text format, plus a slow-call log.
+
+Counters and histograms are kept in memory per process and rendered by
+`render()` for the /metrics endpoint. Each request gets a trace id (a
+context variable, so it follows the work onto fan-out threads) which is
+attached to slow-call log lines.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Calls slower than this (milliseconds) are logged with their trace id; 0 disables
+SLOW_CALL_MS = float(os.environ.get("GARMIN_SLOW_CALL_MS", "0"))
+
+# Latency buckets in seconds, from cache hits up to multi-minute syncs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+logger = logging.getLogger("garmin_service.slow")
+
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id(incoming: str = None) -> str:
+    """Start a trace for the current request, reusing a caller-supplied id."""
+    value = (incoming or "")[:64] or uuid.uuid4().hex[:16]
+    trace_id.set(value)
+    return value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Cumulative histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {series[-1]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+_registry = []
+
+
+def counter(name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+    metric = Counter(name, help_text, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def log_if_slow(what: str, seconds: float):
+    """Log `what` with the current trace id if it took longer than SLOW_CALL_MS."""
+    if SLOW_CALL_MS and seconds * 1000 >= SLOW_CALL_MS:
+        logger.warning("slow call trace=%s %s took %.0fms", trace_id.get() or "-", what, seconds * 1000)
+
+
+def timed(metric: Histogram, **labels):
+    """Decorator recording each call's duration in `metric`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metric.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Metrics shared by the service modules
+UPSTREAM_SECONDS = histogram(
+    "garmin_upstream_request_seconds", "Duration of single Garmin API requests", ("method",))
+UPSTREAM_ERRORS = counter(
+    "garmin_upstream_errors_total", "Failed Garmin API requests by error type", ("method", "error"))
+LOGIN_SECONDS = histogram(
+    "garmin_login_seconds", "Duration of token logins to Garmin Connect")
+GET_CLIENT_SECONDS = histogram(
+    "garmin_get_client_seconds", "Time to obtain a logged-in client, including pool lookups and logins")
+POOL_REQUESTS = counter(
+    "garmin_session_pool_requests_total", "Session pool lookups by result (hit, miss, stale)", ("result",))
+CACHE_REQUESTS = counter(
+    "garmin_cache_requests_total", "Response cache lookups by result (hit, miss, expired)", ("endpoint", "result"))
+COALESCED_CALLS = counter(
+    "garmin_coalesced_calls_total", "Calls that waited for an identical in-flight call instead of running", ("operation",))
+DEPERSONALIZE_SECONDS = histogram(
+    "garmin_depersonalize_seconds", "Time spent depersonalizing responses", ("kind",))
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_seconds", "HTTP request duration until the response is returned", ("route", "method", "status"))
+HTTP_JSON_SECONDS = histogram(
+    "http_json_serialize_seconds", "Time spent serializing responses by media type", ("format",))
+HTTP_COMPRESS_SECONDS = histogram(
+    "http_compress_seconds", "Time spent compressing responses by content coding", ("encoding",))
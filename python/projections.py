@@ -0,0 +1,165 @@
+"""
+Declarative field whitelists for depersonalizing Garmin responses.
+
+Each `Projection` lists the only fields that leave the service, as output
+name -> source path (dotted for nested objects, e.g. "activityType.typeKey").
+Specs are compiled once into plain Python functions, so projecting a record
+is a single dict display with no per-field interpretation. This module is
+the place to audit what data the service passes on.
+"""
+
+# Value of the `layout` option selecting one array per field instead of one
+# dict per record
+COLUMNAR = "columnar"
+
+
+def _path_expr(path: str, root: str, temps: list) -> str:
+    """Expression reading `path` from `root`, None if any level is not a dict."""
+    parts = path.split(".")
+    expr = f"{root}.get({parts[0]!r})"
+    for part in parts[1:]:
+        temp = f"_t{len(temps)}"
+        temps.append(temp)
+        expr = f"({temp}.get({part!r}) if isinstance({temp} := {expr}, dict) else None)"
+    return expr
+
+
+class Projection:
+    """A compiled whitelist of fields for one Garmin record type."""
+
+    def __init__(self, name: str, fields):
+        self.name = name
+        self.fields = tuple(f if isinstance(f, tuple) else (f, f) for f in fields)
+        self.names = [out for out, _ in self.fields]
+        self.project = self._compile_rows()
+        self.project_columns = self._compile_columns()
+
+    def _compile_rows(self):
+        temps = []
+        items = ", ".join(f"{out!r}: {_path_expr(path, 'r', temps)}" for out, path in self.fields)
+        return self._build(f"def project(r):\n    return {{{items}}}\n", "project")
+
+    def _compile_columns(self):
+        temps = []
+        items = ", ".join(
+            f"{out!r}: [{_path_expr(path, 'r', temps)} for r in records]" for out, path in self.fields
+        )
+        return self._build(f"def project_columns(records):\n    return {{{items}}}\n", "project_columns")
+
+    def _build(self, source: str, name: str):
+        namespace = {}
+        exec(compile(source, f"<projection {self.name}>", "exec"), namespace)
+        return namespace[name]
+
+    def rows(self, records) -> list:
+        """Project every dict in `records`, skipping anything else."""
+        project = self.project
+        return [project(r) for r in records or () if isinstance(r, dict)]
+
+    def columns(self, records) -> dict:
+        """Project `records` into the columnar layout (see `columnar`)."""
+        records = [r for r in records or () if isinstance(r, dict)]
+        return {"fields": self.names, "rows": len(records), "columns": self.project_columns(records)}
+
+
+def columnar(records: list) -> dict:
+    """Columnar layout of already projected dicts: one array per field.
+
+    Fields appear in first-seen order; records missing a field get None.
+    Records that are None (no data) become a row of Nones.
+    """
+    fields = {}
+    for record in records:
+        if record:
+            fields.update(dict.fromkeys(record))
+    return {
+        "fields": list(fields),
+        "rows": len(records),
+        "columns": {field: [(record or {}).get(field) for record in records] for field in fields},
+    }
+
+
+SLEEP = Projection("sleep", (
+    "calendarDate",
+    "sleepTimeSeconds",
+    "deepSleepSeconds",
+    "lightSleepSeconds",
+    "remSleepSeconds",
+    "awakeSleepSeconds",
+    ("sleepScore", "sleepScores.overall.value"),
+    "averageSpO2Value",
+    "averageRespirationValue",
+    "sleepStartTimestampGMT",
+    "sleepEndTimestampGMT",
+    "avgSleepStress",
+))
+
+DAILY_SUMMARY = Projection("daily_summary", (
+    "calendarDate",
+    "totalSteps",
+    "totalDistanceMeters",
+    "activeKilocalories",
+    "totalKilocalories",
+    "floorsAscended",
+    "floorsDescended",
+    "intensityMinutesGoal",
+    "moderateIntensityMinutes",
+    "vigorousIntensityMinutes",
+    "restingHeartRate",
+    "minHeartRate",
+    "maxHeartRate",
+    "averageStressLevel",
+    "maxStressLevel",
+    "stressDuration",
+    "restStressDuration",
+    "activityStressDuration",
+    "lowStressDuration",
+    "mediumStressDuration",
+    "highStressDuration",
+    "bodyBatteryChargedValue",
+    "bodyBatteryDrainedValue",
+    "bodyBatteryHighestValue",
+    "bodyBatteryLowestValue",
+    "bodyBatteryMostRecentValue",
+))
+
+STRESS = Projection("stress", (
+    "calendarDate",
+    "overallStressLevel",
+    "restStressDuration",
+    "activityStressDuration",
+    "lowStressDuration",
+    "mediumStressDuration",
+    "highStressDuration",
+    "stressQualifier",
+))
+
+BODY_BATTERY = Projection("body_battery", (
+    "startTimestampGMT",
+    "endTimestampGMT",
+    "bodyBatteryLevel",
+    "bodyBatteryStatus",
+))
+
+# Heart rate day metadata; the series itself is handled in depersonalize_heart_rate
+HEART_RATE = Projection("heart_rate", (
+    "calendarDate",
+    "restingHeartRate",
+    "maxHeartRate",
+    "minHeartRate",
+))
+
+ACTIVITY = Projection("activity", (
+    "activityId",
+    "activityName",
+    ("activityType", "activityType.typeKey"),
+    "startTimeLocal",
+    "duration",  # seconds
+    "distance",  # meters
+    "calories",
+    "averageHR",
+    "maxHR",
+    "averageSpeed",  # m/s
+    "elevationGain",
+    "steps",
+))
@@ -0,0 +1,75 @@
+"""
+Per-day access to Garmin endpoints that accept a date range.
+
+Some Garmin endpoints (body battery, for example) return one item per day
+for a whole date range. `RangeFetcher` lets per-day code such as the sync
+fan-out keep asking for single days while the upstream calls are made for
+blocks of days: the first request for a day fetches its whole block and
+the other days of that block are served from the result.
+"""
+import os
+import threading
+from concurrent.futures import Future
+from datetime import date, timedelta
+
+# Days covered by one upstream range call
+RANGE_BLOCK_DAYS = int(os.environ.get("GARMIN_RANGE_BLOCK_DAYS", "28"))
+
+
+def split_by_day(items: list, days: list, day_key: str = "date") -> dict:
+    """Group range response items into {day: [items]} for every day in `days`."""
+    by_day = {day: [] for day in days}
+    for item in items or ():
+        if isinstance(item, dict) and item.get(day_key) in by_day:
+            by_day[item[day_key]].append(item)
+    return by_day
+
+
+def date_windows(start_date: str, end_date: str, days: int) -> list:
+    """Consecutive inclusive (first, last) ISO date pairs of `days` days covering the range."""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    step = timedelta(days=max(1, days))
+    windows = []
+    while start <= end:
+        last = min(end, start + step - timedelta(days=1))
+        windows.append((start.isoformat(), last.isoformat()))
+        start = last + timedelta(days=1)
+    return windows
+
+
+class RangeFetcher:
+    """Callable `day -> value` backed by one `fetch_range` call per block.
+
+    `fetch_range(first_day, last_day)` returns {day: value} for every day
+    in that inclusive range. Blocks are RANGE_BLOCK_DAYS long, aligned on
+    `start_date` and clipped to `end_date`. Concurrent requests for days of
+    the same block wait for a single upstream call.
+    """
+
+    def __init__(self, fetch_range, start_date: str, end_date: str, block_days: int = RANGE_BLOCK_DAYS):
+        self.fetch_range = fetch_range
+        self.start = date.fromisoformat(start_date)
+        self.end = date.fromisoformat(end_date)
+        self.block_days = max(1, block_days)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _block_bounds(self, index: int) -> tuple:
+        first = self.start + timedelta(days=index * self.block_days)
+        last = min(self.end, first + timedelta(days=self.block_days - 1))
+        return first.isoformat(), last.isoformat()
+
+    def __call__(self, day: str):
+        index = (date.fromisoformat(day) - self.start).days // self.block_days
+        with self._lock:
+            future = self._blocks.get(index)
+            owner = future is None
+            if owner:
+                future = self._blocks[index] = Future()
+
+        if owner:
+            try:
+                future.set_result(self.fetch_range(*self._block_bounds(index)))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()[day]
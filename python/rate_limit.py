@@ -0,0 +1,241 @@
+"""
+Upstream protection for Garmin Connect calls.
+
+Every call goes through a global and a per-user token bucket, is retried
+with jittered exponential backoff on 429/5xx/network errors (honoring
+Retry-After), and is short-circuited while Garmin looks degraded. Bucket
+rates adapt: a 429 halves them, successes slowly restore the configured
+rate.
+"""
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from idle_lru import IdleLRU
+
+# Requests per second (and burst) across all users in this process
+RATE_GLOBAL = float(os.environ.get("GARMIN_RATE_GLOBAL", "20"))
+RATE_GLOBAL_BURST = float(os.environ.get("GARMIN_RATE_GLOBAL_BURST", "40"))
+
+# Requests per second (and burst) for a single user
+RATE_USER = float(os.environ.get("GARMIN_RATE_USER", "8"))
+RATE_USER_BURST = float(os.environ.get("GARMIN_RATE_USER_BURST", "16"))
+
+# Retries for retryable failures, and the backoff bounds in seconds
+RETRY_MAX = int(os.environ.get("GARMIN_RETRY_MAX", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("GARMIN_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.environ.get("GARMIN_RETRY_MAX_DELAY", "30"))
+
+# Consecutive upstream failures that open the breaker, and how long it stays open
+BREAKER_THRESHOLD = int(os.environ.get("GARMIN_BREAKER_THRESHOLD", "8"))
+BREAKER_RESET = float(os.environ.get("GARMIN_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Garmin while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket with an adjustable refill rate."""
+
+    def __init__(self, rate: float, burst: float):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self):
+        """Halve the rate after Garmin pushed back (429)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def full(self) -> bool:
+        """Whether the bucket has refilled, so a fresh one would behave the same."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.burst
+
+    def recover(self):
+        """Creep back towards the configured rate after a success."""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; half-opens after `reset` seconds."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self._probing:
+                # Let a single probe through to test whether Garmin recovered
+                self._probing = True
+                return
+            retry_in = max(0, self.reset - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Garmin Connect unavailable, retry in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+def _exception_chain(exc):
+    """The exception and everything it wraps (cause, context, garth's .error)."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        wrapped = getattr(exc, "error", None)
+        exc = wrapped if isinstance(wrapped, BaseException) else (exc.__cause__ or exc.__context__)
+
+
+def upstream_status(exc) -> tuple:
+    """(HTTP status, Retry-After seconds) found anywhere in the exception chain."""
+    for e in _exception_chain(exc):
+        response = getattr(e, "response", None)
+        status = getattr(response, "status_code", None)
+        if status:
+            return status, _retry_after(getattr(response, "headers", None) or {})
+    if any("TooManyRequests" in type(e).__name__ for e in _exception_chain(exc)):
+        return 429, None
+    return None, None
+
+
+def _retry_after(headers) -> float:
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable(exc, status) -> bool:
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # requests' connection/timeout errors are OSErrors
+    return any(isinstance(e, OSError) for e in _exception_chain(exc))
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+class UpstreamGuard:
+    """Rate limits, retries and circuit breaking shared by all Garmin calls.
+
+    With a `scheduler` (see scheduler.py), each attempt holds one of its
+    slots while it waits for global tokens and runs, so users take turns
+    at the shared rate instead of racing for it.
+    """
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler
+        self.global_bucket = TokenBucket(RATE_GLOBAL, RATE_GLOBAL_BURST)
+        self.breaker = CircuitBreaker()
+        # Buckets still refilling are kept, or a user could restart at full burst
+        self._user_buckets = IdleLRU(lambda key: TokenBucket(RATE_USER, RATE_USER_BURST),
+                                     in_use=lambda bucket: not bucket.full())
+
+    def bucket_for(self, key: str) -> TokenBucket:
+        return self._user_buckets.get(key)
+
+    def call(self, key: str, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) for user `key` under the shared limits."""
+        user_bucket = self.bucket_for(key)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            user_bucket.acquire()
+            try:
+                with self.scheduler.slot(key) if self.scheduler else nullcontext():
+                    self.global_bucket.acquire()
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                status, retry_after = upstream_status(e)
+                retryable = is_retryable(e, status)
+                if status == 429:
+                    # Garmin is up but wants us to slow down
+                    self.global_bucket.throttle()
+                    user_bucket.throttle()
+                    self.breaker.record_success()
+                elif retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The request was bad, not Garmin; don't count it against the breaker
+                    self.breaker.record_success()
+
+                if not retryable or attempt >= RETRY_MAX:
+                    raise
+                time.sleep(backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            self.global_bucket.recover()
+            user_bucket.recover()
+            return result
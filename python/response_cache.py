@@ -0,0 +1,167 @@
+"""
+On-disk cache of raw Garmin responses.
+
+Entries live under each user's tokenstore directory, one JSON file per
+(endpoint, date). Data for a day more than CACHE_FINALIZED_AFTER_DAYS old
+rarely changes, so entries with data fetched after that point never
+expire; entries for recent days, and responses without data (the device
+may upload late), expire after CACHE_TTL seconds. Each user's cache is
+bounded by CACHE_MAX_BYTES, evicting least recently used files first.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from atomic_json import atomic_write_json
+from idle_lru import IdleLRU
+from metrics import CACHE_REQUESTS
+
+# Seconds before an entry for a recent (still changing) day is refetched
+CACHE_TTL = float(os.environ.get("GARMIN_CACHE_TTL", "900"))
+
+# Days after which Garmin data for a date is considered final
+CACHE_FINALIZED_AFTER_DAYS = int(os.environ.get("GARMIN_CACHE_FINALIZED_AFTER_DAYS", "2"))
+
+# Upper bound on cached bytes per user
+CACHE_MAX_BYTES = int(os.environ.get("GARMIN_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Set to "1"/"true" to turn the cache off entirely
+CACHE_DISABLED = os.environ.get("GARMIN_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+# Directory name inside the user's tokenstore
+CACHE_DIR_NAME = "cache"
+
+# Sentinel for a cache miss (None is a valid cached response)
+MISS = object()
+
+
+def is_finalized(day: str, today: date = None) -> bool:
+    """Whether Garmin data for `day` (YYYY-MM-DD) should no longer change."""
+    today = today or date.today()
+    try:
+        return date.fromisoformat(day) <= today - timedelta(days=CACHE_FINALIZED_AFTER_DAYS)
+    except ValueError:
+        return False
+
+
+class ResponseCache:
+    """Size-bounded JSON file cache for one user."""
+
+    def __init__(self, root: Path, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size = None  # computed lazily on first write
+        self._lock = threading.Lock()
+
+    def _path(self, endpoint: str, key: str) -> Path:
+        return self.root / endpoint / f"{key}.json"
+
+    def get(self, endpoint: str, key: str):
+        """Return the cached response for (endpoint, key), or MISS."""
+        path = self._path(endpoint, key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            CACHE_REQUESTS.inc(endpoint=endpoint, result="miss")
+            return MISS
+
+        if not entry.get("finalized") and time.time() - entry.get("storedAt", 0) > self.ttl:
+            CACHE_REQUESTS.inc(endpoint=endpoint, result="expired")
+            return MISS
+
+        CACHE_REQUESTS.inc(endpoint=endpoint, result="hit")
+
+        try:
+            # Touch so size-based eviction drops the least recently used first
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("data")
+
+    def set(self, endpoint: str, key: str, data, day: str = None, has_data: bool = None):
+        """Store a response; `day` decides finality and defaults to `key`.
+
+        Responses without data (`has_data`, default: non-empty) never become
+        final, since they may just mean the device hasn't synced yet.
+        """
+        path = self._path(endpoint, key)
+        if has_data is None:
+            has_data = bool(data)
+        entry = {
+            "storedAt": time.time(),
+            "finalized": has_data and is_finalized(day or key),
+            "data": data,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+        size = atomic_write_json(path, entry, separators=(",", ":"))
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += size - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path in self._files():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._size = 0
+
+    def _files(self):
+        if not self.root.exists():
+            return []
+        return [p for p in self.root.glob("*/*.json") if p.is_file()]
+
+    def _disk_usage(self) -> int:
+        total = 0
+        for path in self._files():
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def _evict(self):
+        # Drop least recently used entries until we're back under 90% of the limit
+        entries = []
+        for path in self._files():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        size = sum(e[1] for e in entries)
+        target = self.max_bytes * 0.9
+        for _, file_size, path in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+                size -= file_size
+            except OSError:
+                pass
+        self._size = size
+
+
+_caches = IdleLRU(lambda tokenstore: ResponseCache(Path(tokenstore) / CACHE_DIR_NAME))
+
+
+def cache_for(tokenstore: str) -> ResponseCache:
+    """The response cache stored under a user's tokenstore directory."""
+    return _caches.get(tokenstore)
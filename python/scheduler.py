@@ -0,0 +1,151 @@
+"""
+Fair sharing of upstream capacity between users.
+
+`FairScheduler` caps how many Garmin requests are in flight at once across
+all users of a process. When the budget is used up, waiting requests are
+granted freed slots round-robin by user, so a user with hundreds of queued
+backfill calls doesn't delay another user's single call by more than one
+turn. `FairQueue` applies the same round-robin order to queued jobs.
+
+Requests also belong to a lane: interactive (someone is waiting on a page)
+or bulk (syncs, backfills, jobs). Waiting interactive requests always get
+the next free slot, and bulk requests may never hold the share of the
+budget reserved for interactive ones. The lane comes from the
+`current_lane` context variable, which request handlers and job workers
+set and fan-out threads inherit.
+"""
+import contextvars
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Garmin requests in flight at once across all users of this process
+UPSTREAM_CONCURRENCY = int(os.environ.get("GARMIN_UPSTREAM_CONCURRENCY", "16"))
+
+# Share of that budget bulk traffic can never use, kept free for interactive calls
+INTERACTIVE_RESERVED = float(os.environ.get("GARMIN_INTERACTIVE_RESERVED", "0.25"))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+current_lane = contextvars.ContextVar("lane", default=INTERACTIVE)
+
+
+class _RoundRobin:
+    """Per-key FIFO queues served one item per key in turn."""
+
+    def __init__(self):
+        self._queues = OrderedDict()
+        self.size = 0
+
+    def push(self, key, item):
+        self._queues.setdefault(key, deque()).append(item)
+        self.size += 1
+
+    def pop(self):
+        """Next item, taken from the key whose turn it is."""
+        key, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        if queue:
+            # Back of the line until every other key had a turn
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self.size -= 1
+        return item
+
+    def backlog(self) -> dict:
+        return {key: len(queue) for key, queue in self._queues.items()}
+
+
+class FairScheduler:
+    """Global concurrency budget with lanes and round-robin grants per user."""
+
+    def __init__(self, budget: int = UPSTREAM_CONCURRENCY, reserved: float = INTERACTIVE_RESERVED):
+        self.budget = max(1, budget)
+        # Bulk may use everything but the reserved share (and always at least one slot)
+        self.bulk_limit = max(1, self.budget - math.ceil(self.budget * reserved))
+        self.active = {INTERACTIVE: 0, BULK: 0}
+        self._waiting = {INTERACTIVE: _RoundRobin(), BULK: _RoundRobin()}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, key: str, lane: str = None):
+        """Hold one unit of the budget for `key` while the block runs."""
+        lane = BULK if (lane or current_lane.get()) == BULK else INTERACTIVE
+        self.acquire(key, lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def _can_start(self, lane: str) -> bool:
+        if sum(self.active.values()) >= self.budget:
+            return False
+        if lane == BULK:
+            return self.active[BULK] < self.bulk_limit
+        return True
+
+    def acquire(self, key: str, lane: str = INTERACTIVE):
+        with self._lock:
+            # Don't overtake anyone already waiting in this lane (or interactive)
+            ahead = self._waiting[INTERACTIVE].size + (self._waiting[BULK].size if lane == BULK else 0)
+            if not ahead and self._can_start(lane):
+                self.active[lane] += 1
+                return
+            granted = threading.Event()
+            self._waiting[lane].push(key, granted)
+        granted.wait()
+
+    def release(self, lane: str = INTERACTIVE):
+        with self._lock:
+            self.active[lane] -= 1
+            # Interactive waiters first, then bulk while under its limit
+            for waiting_lane in (INTERACTIVE, BULK):
+                waiting = self._waiting[waiting_lane]
+                while waiting.size and self._can_start(waiting_lane):
+                    self.active[waiting_lane] += 1
+                    waiting.pop().set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lanes = {
+                lane: {
+                    "active": self.active[lane],
+                    "waiting": self._waiting[lane].size,
+                    "backlog": self._waiting[lane].backlog(),
+                }
+                for lane in (INTERACTIVE, BULK)
+            }
+            return {
+                "budget": self.budget,
+                "bulkLimit": self.bulk_limit,
+                "active": sum(self.active.values()),
+                "waiting": sum(lane["waiting"] for lane in lanes.values()),
+                "lanes": lanes,
+            }
+
+
+class FairQueue:
+    """Blocking queue that hands out items round-robin by key."""
+
+    def __init__(self):
+        self._items = _RoundRobin()
+        self._ready = threading.Condition()
+
+    def put(self, key, item):
+        with self._ready:
+            self._items.push(key, item)
+            self._ready.notify()
+
+    def get(self):
+        with self._ready:
+            while not self._items.size:
+                self._ready.wait()
+            return self._items.pop()
+
+    def backlog(self) -> dict:
+        with self._ready:
+            return self._items.backlog()
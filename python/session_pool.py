@@ -0,0 +1,136 @@
+"""
+In-process pool of authenticated Garmin clients.
+
+Keeps one logged-in client per user so repeated calls reuse the loaded
+OAuth tokens and the client's HTTP session instead of logging in again.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from metrics import POOL_REQUESTS
+from singleflight import SingleFlight
+
+# Maximum number of warm sessions kept in memory (least recently used go first)
+POOL_MAX_SIZE = int(os.environ.get("GARMIN_POOL_MAX_SIZE", "64"))
+
+# Seconds a session may sit unused before it is dropped
+POOL_IDLE_TTL = float(os.environ.get("GARMIN_POOL_IDLE_TTL", "1800"))
+
+# Files written by garth.dump(); their mtime tells us when tokens changed on disk
+TOKEN_FILES = ("oauth1_token.json", "oauth2_token.json")
+
+
+def token_mtime(tokenstore: str):
+    """Latest modification time of the token files, or None if missing."""
+    mtimes = []
+    for name in TOKEN_FILES:
+        try:
+            mtimes.append(os.stat(Path(tokenstore) / name).st_mtime)
+        except OSError:
+            continue
+    return max(mtimes) if mtimes else None
+
+
+class _Session:
+    """A logged-in client plus the bookkeeping needed to reuse it."""
+
+    def __init__(self, client, tokenstore: str):
+        self.client = client
+        self.tokenstore = tokenstore
+        self.token_mtime = token_mtime(tokenstore)
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SessionPool:
+    """LRU pool of logged-in clients keyed by user id.
+
+    `login` is called with a tokenstore path and must return a logged-in
+    client. Sessions are dropped when idle for longer than `idle_ttl`, when
+    the pool grows past `max_size`, or when the token files on disk change
+    (e.g. after re-authenticating), and expired OAuth2 tokens are refreshed
+    and written back before a client is handed out.
+    """
+
+    def __init__(self, login, max_size: int = POOL_MAX_SIZE, idle_ttl: float = POOL_IDLE_TTL):
+        self._login = login
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # A burst of requests for a user without a session triggers one login
+        self._logins = SingleFlight("login")
+
+    def acquire(self, key: str, tokenstore: str):
+        """Return a warm client for `key`, logging in only when needed."""
+        now = time.monotonic()
+        mtime = token_mtime(tokenstore)
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(key)
+            if session and (session.tokenstore != tokenstore or session.token_mtime != mtime):
+                # Tokens were replaced on disk; the cached login is stale
+                del self._sessions[key]
+                session = None
+                POOL_REQUESTS.inc(result="stale")
+            elif session is None:
+                POOL_REQUESTS.inc(result="miss")
+            if session:
+                POOL_REQUESTS.inc(result="hit")
+                self._sessions.move_to_end(key)
+                session.last_used = now
+
+        if session is None:
+            session = self._logins.do(key, self._login_session, key, tokenstore)
+
+        self._refresh_if_expired(session)
+        return session.client
+
+    def _login_session(self, key: str, tokenstore: str) -> _Session:
+        return self.put(key, tokenstore, self._login(tokenstore))
+
+    def put(self, key: str, tokenstore: str, client) -> _Session:
+        """Store an already logged-in client for `key`."""
+        session = _Session(client, tokenstore)
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+        return session
+
+    def discard(self, key: str):
+        """Drop the session for `key`, if any."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_idle(self, now: float):
+        # OrderedDict is kept in LRU order, so idle sessions are at the front
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            del self._sessions[key]
+
+    def _refresh_if_expired(self, session: _Session):
+        garth = getattr(session.client, "garth", None)
+        token = getattr(garth, "oauth2_token", None)
+        if token is None or not token.expired:
+            return
+        with session.lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not garth.oauth2_token.expired:
+                return
+            garth.refresh_oauth2()
+            garth.dump(session.tokenstore)
+            session.token_mtime = token_mtime(session.tokenstore)
@@ -0,0 +1,61 @@
+"""
+Coalescing of identical concurrent calls.
+
+While a call for a key is in flight, later callers with the same key wait
+for it and get the same result (or exception) instead of starting their
+own. Nothing is cached once the call completes.
+"""
+import json
+import threading
+from concurrent.futures import Future
+from functools import wraps
+
+from metrics import COALESCED_CALLS
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            COALESCED_CALLS.inc(operation=self.name)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def call_key(*args, **kwargs) -> str:
+    """Stable key for a call's arguments (dicts compare by content)."""
+    return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+def coalesce(fn):
+    """Decorator sharing one execution among identical concurrent calls of `fn`."""
+    flight = SingleFlight(fn.__name__)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return flight.do(call_key(*args, **kwargs), fn, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The service modules live flat in python/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,133 @@
+import random
+from datetime import date, timedelta
+
+from aggregates import MEAN, SERIES, SUM, RollingAggregates, day_values
+
+START = date(2024, 1, 1)
+
+
+def day(offset: int) -> str:
+    return (START + timedelta(days=offset)).isoformat()
+
+
+def brute_force(days: dict, windows: tuple) -> dict:
+    """The aggregates recomputed from scratch over the final value of every day."""
+    latest = max(date.fromisoformat(d).toordinal() for d in days)
+    expected = {}
+    for name, (_, _, reduction) in SERIES.items():
+        for window in windows:
+            values = [
+                values[name] for d, values in days.items()
+                if values.get(name) is not None and date.fromisoformat(d).toordinal() > latest - window
+            ]
+            value = None
+            if values:
+                total = sum(values)
+                value = round(total / len(values) if reduction == MEAN else total, 2)
+            expected[name, f"{window}d"] = {"value": value, "days": len(values)}
+    return expected
+
+
+def windows_of(aggregates: RollingAggregates) -> dict:
+    return {
+        (name, label): window
+        for name, metric in aggregates.summary()["metrics"].items()
+        for label, window in metric["windows"].items()
+    }
+
+
+def test_mean_and_sum_over_trailing_windows():
+    aggregates = RollingAggregates((3, 7))
+    for i, steps in enumerate([1000, 2000, 3000, 4000, 5000]):
+        aggregates.add(day(i), {"steps": steps, "intensityMinutes": 10})
+
+    summary = aggregates.summary()
+    assert summary["asOf"] == day(4)
+    assert summary["windows"] == [3, 7]
+    assert summary["metrics"]["steps"]["windows"] == {
+        "3d": {"value": 4000.0, "days": 3},
+        "7d": {"value": 3000.0, "days": 5},
+    }
+    assert summary["metrics"]["intensityMinutes"]["reduction"] == SUM
+    assert summary["metrics"]["intensityMinutes"]["windows"]["3d"] == {"value": 30, "days": 3}
+    assert summary["metrics"]["sleepHours"]["windows"]["7d"] == {"value": None, "days": 0}
+
+
+def test_days_leave_the_window_as_newer_days_arrive():
+    aggregates = RollingAggregates((2,))
+    aggregates.add(day(0), {"steps": 100})
+    aggregates.add(day(1), {"steps": 200})
+    # Skipping a day drops day 0 and the empty day 2 counts for nothing
+    aggregates.add(day(3), {"steps": 400})
+    assert aggregates.summary()["metrics"]["steps"]["windows"]["2d"] == {"value": 400.0, "days": 1}
+
+    # A jump past the longest window starts over
+    aggregates.add(day(30), {"steps": 50})
+    assert aggregates.summary()["metrics"]["steps"]["windows"]["2d"] == {"value": 50.0, "days": 1}
+
+
+def test_resyncing_a_day_replaces_its_values():
+    aggregates = RollingAggregates((7,))
+    aggregates.add(day(0), {"steps": 100, "restingHeartRate": 50})
+    aggregates.add(day(1), {"steps": 300})
+    aggregates.add(day(0), {"steps": 200, "restingHeartRate": None})
+
+    metrics = aggregates.summary()["metrics"]
+    assert metrics["steps"]["windows"]["7d"] == {"value": 250.0, "days": 2}
+    assert metrics["restingHeartRate"]["windows"]["7d"] == {"value": None, "days": 0}
+
+
+def test_days_older_than_the_longest_window_are_rejected():
+    aggregates = RollingAggregates((3,))
+    aggregates.add(day(10), {"steps": 100})
+    assert aggregates.add(day(8), {"steps": 200})
+    assert not aggregates.add(day(7), {"steps": 300})
+    assert aggregates.summary()["metrics"]["steps"]["windows"]["3d"] == {"value": 150.0, "days": 2}
+
+
+def test_matches_brute_force_on_random_syncs():
+    rng = random.Random(7)
+    windows = (3, 7)
+    for _ in range(50):
+        aggregates = RollingAggregates(windows)
+        kept = {}
+        newest = 0
+        for _ in range(40):
+            # Mostly forward, with re-syncs and backfills of recent days
+            offset = max(0, newest + rng.randint(-8, 3))
+            values = {name: rng.choice([None, float(rng.randint(0, 100))]) for name in SERIES}
+            if aggregates.add(day(offset), values):
+                newest = max(newest, offset)
+                kept[day(offset)] = values
+            # Days that left the longest window no longer count
+            kept = {d: v for d, v in kept.items() if (START + timedelta(days=newest) - date.fromisoformat(d)).days < 7}
+            assert windows_of(aggregates) == brute_force(kept, windows)
+
+
+def test_snapshot_round_trip():
+    aggregates = RollingAggregates((3, 7))
+    for i in range(10):
+        aggregates.add(day(i), {"steps": 100 * i, "sleepHours": 7.5})
+
+    restored = RollingAggregates.from_snapshot(aggregates.snapshot(), (3, 7))
+    assert restored.summary() == aggregates.summary()
+    assert list(aggregates.snapshot()["days"]) == [day(i) for i in range(3, 10)]
+
+
+def test_day_values_skip_failed_and_unfetched_metrics():
+    day_data = {
+        "sleep": {"sleepTimeSeconds": 6 * 3600, "sleepScore": 80},
+        "activity": {"totalSteps": 5000, "restingHeartRate": -1,
+                     "moderateIntensityMinutes": 10, "vigorousIntensityMinutes": 5},
+        "stress": None,
+        "stressError": "boom",
+        "upToDate": ["bodyBattery"],
+    }
+    values = day_values(day_data)
+    assert values["sleepHours"] == 6.0
+    assert values["sleepDebtHours"] == 2.0
+    assert values["steps"] == 5000.0
+    # Negative values mean "no data"
+    assert values["restingHeartRate"] is None
+    assert values["intensityMinutes"] == 20.0
+    assert "stressLevel" not in values
@@ -0,0 +1,41 @@
+import threading
+import time
+
+from fanout import fan_out
+
+
+def test_each_sync_keeps_its_own_concurrency():
+    lock = threading.Lock()
+    in_flight = []
+    peaks = {}
+
+    def fetcher(name):
+        def fetch(day):
+            with lock:
+                in_flight.append(name)
+                peaks[name] = max(peaks.get(name, 0), len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(name)
+            return day
+        return fetch
+
+    def run(name, concurrency):
+        fetchers = {f"m{i}": fetcher(name) for i in range(4)}
+        list(fan_out(range(3), fetchers, "user", concurrency=concurrency))
+
+    wide = threading.Thread(target=run, args=("wide", 4))
+    wide.start()
+    run("narrow", 1)
+    wide.join()
+
+    # Calls only start while the user has fewer than the caller's limit in flight
+    assert peaks["narrow"] == 1
+    assert peaks["wide"] <= 4
+
+
+def test_results_come_back_in_day_order():
+    fetchers = {"a": lambda day: day * 2, "b": lambda day: day + 1}
+    results = list(fan_out(range(5), fetchers, "order", concurrency=3))
+    assert [day for day, _ in results] == list(range(5))
+    assert results[2][1] == {"a": (4, None), "b": (3, None)}
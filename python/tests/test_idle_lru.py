@@ -0,0 +1,40 @@
+import idle_lru
+from idle_lru import IdleLRU
+
+
+class Clock:
+    now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_drops_least_recently_used_past_max_size():
+    lru = IdleLRU(lambda key: [key], max_size=2)
+    a = lru.get("a")
+    lru.get("b")
+    assert lru.get("a") is a
+    lru.get("c")
+    assert len(lru) == 2
+    # "b" was least recently used, so it is the one recreated
+    assert lru.get("a") is a
+
+
+def test_drops_idle_entries_unless_in_use(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(idle_lru, "time", clock)
+    held = set()
+    lru = IdleLRU(lambda key: key, max_size=10, idle_ttl=60, in_use=lambda value: value in held)
+    lru.get("idle")
+    lru.get("held")
+    held.add("held")
+    clock.now += 61
+    lru.get("new")
+    assert list(lru._entries) == ["new", "held"]
+
+
+def test_keeps_the_requested_entry_when_everything_else_is_in_use():
+    lru = IdleLRU(lambda key: key, max_size=1, in_use=lambda value: True)
+    lru.get("a")
+    lru.get("b")
+    assert set(lru._entries) == {"a", "b"}
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import rate_limit
+from rate_limit import CircuitBreaker, CircuitOpenError, UpstreamGuard, upstream_status
+
+
+class Clock:
+    """Stands in for the time module: sleeping just moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    # Backoff without jitter: always the longest delay
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(rate_limit, "RETRY_MAX", 2)
+    return clock
+
+
+def failing(*errors):
+    """A call that raises each of `errors` in turn, then returns "ok"."""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    fn.calls = calls
+    return fn
+
+
+def test_breaker_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(threshold=2, reset=30)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    # Only the probe goes through until it reports back
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed probe reopens at once, without waiting for the threshold
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_retryable_failures_open_the_breaker(clock):
+    guard = UpstreamGuard()
+    guard.breaker = CircuitBreaker(threshold=2)
+    fn = failing(HTTPError(503), HTTPError(502), HTTPError(503))
+    with pytest.raises(CircuitOpenError):
+        guard.call("user", fn)
+    assert len(fn.calls) == 2
+    assert guard.breaker.state == "open"
+
+
+def test_429_throttles_without_opening_the_breaker(clock):
+    guard = UpstreamGuard()
+    guard.breaker = CircuitBreaker(threshold=1)
+    fn = failing(HTTPError(429, {"Retry-After": "7"}), HTTPError(429))
+    assert guard.call("user", fn) == "ok"
+
+    assert guard.breaker.state == "closed"
+    # Retry-After sets a floor under the backoff; then plain exponential backoff
+    assert clock.sleeps[0] == 7
+    assert clock.sleeps[-1] == rate_limit.RETRY_BASE_DELAY * 2
+    # Halved twice, then nudged back up by the success
+    assert guard.bucket_for("user").rate == pytest.approx(rate_limit.RATE_USER * (0.25 + 0.05))
+    assert guard.global_bucket.rate < rate_limit.RATE_GLOBAL
+
+
+def test_non_retryable_errors_are_not_counted(clock):
+    guard = UpstreamGuard()
+    guard.breaker = CircuitBreaker(threshold=1)
+    for error in (HTTPError(400), HTTPError(404), ValueError("bad date")):
+        fn = failing(error)
+        with pytest.raises(type(error)):
+            guard.call("user", fn)
+        assert len(fn.calls) == 1
+    assert guard.breaker.state == "closed"
+    assert guard.breaker.failures == 0
+    assert clock.sleeps == []
+
+
+def test_network_errors_are_retried(clock):
+    guard = UpstreamGuard()
+    fn = failing(ConnectionError("reset"), TimeoutError("slow"))
+    assert guard.call("user", fn) == "ok"
+    assert len(fn.calls) == 3
+
+
+def test_retry_after_parsing():
+    assert upstream_status(HTTPError(429, {"Retry-After": "12"})) == (429, 12.0)
+    assert upstream_status(HTTPError(503, {"Retry-After": "-5"})) == (503, 0.0)
+    assert upstream_status(HTTPError(503, {"Retry-After": "soon"})) == (503, None)
+    assert upstream_status(HTTPError(500)) == (500, None)
+
+    when = datetime.now(timezone.utc) + timedelta(seconds=120)
+    status, delay = upstream_status(HTTPError(429, {"Retry-After": format_datetime(when, usegmt=True)}))
+    assert status == 429
+    assert 110 < delay <= 120
+
+    # The status is found on wrapped exceptions too
+    try:
+        try:
+            raise HTTPError(429, {"Retry-After": "3"})
+        except HTTPError as e:
+            raise RuntimeError("fetch failed") from e
+    except RuntimeError as e:
+        assert upstream_status(e) == (429, 3.0)
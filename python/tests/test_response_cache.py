@@ -0,0 +1,38 @@
+import json
+from datetime import date, timedelta
+
+import garmin_service
+from response_cache import MISS, ResponseCache
+
+OLD_DAY = (date.today() - timedelta(days=30)).isoformat()
+
+
+def test_only_responses_with_data_become_final(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=0)
+    cache.set("get_user_summary", OLD_DAY, {"totalSteps": 10}, has_data=True)
+    cache.set("get_stress_data", OLD_DAY, {"calendarDate": OLD_DAY}, has_data=False)
+    cache.set("get_body_battery", OLD_DAY, [])
+
+    assert cache.get("get_user_summary", OLD_DAY) == {"totalSteps": 10}
+    assert cache.get("get_stress_data", OLD_DAY) is MISS
+    assert cache.get("get_body_battery", OLD_DAY) is MISS
+
+
+def test_placeholder_responses_keep_a_ttl(tmp_path, monkeypatch):
+    class Client:
+        def get_sleep_data(self, day):
+            return {"dailySleepDTO": {"calendarDate": day, "sleepTimeSeconds": None}}
+
+        def get_user_summary(self, day):
+            return {"calendarDate": day, "totalSteps": 0}
+
+    monkeypatch.setattr(garmin_service, "USER_TOKENSTORE_BASE", str(tmp_path))
+    monkeypatch.setattr(garmin_service, "CACHE_DISABLED", False)
+    monkeypatch.setattr(garmin_service, "upstream",
+                        lambda client, user_id, method, *args: getattr(client, method)(*args))
+    for method in ("get_sleep_data", "get_user_summary"):
+        garmin_service.cached_call(Client(), "user", method, OLD_DAY)
+
+    entries = tmp_path / "user" / "cache"
+    assert not json.loads((entries / "get_sleep_data" / f"{OLD_DAY}.json").read_text())["finalized"]
+    assert json.loads((entries / "get_user_summary" / f"{OLD_DAY}.json").read_text())["finalized"]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from scheduler import BULK, INTERACTIVE, FairScheduler
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def waiting(scheduler: FairScheduler, lane: str) -> int:
+    return scheduler.stats()["lanes"][lane]["waiting"]
+
+
+def queue_waiter(scheduler: FairScheduler, key: str, lane: str, granted: list, label: str = None):
+    """Start a thread blocked in acquire(); it appends `label` once granted."""
+    before = waiting(scheduler, lane)
+
+    def run():
+        scheduler.acquire(key, lane)
+        granted.append(label or key)
+
+    threading.Thread(target=run, daemon=True).start()
+    wait_until(lambda: waiting(scheduler, lane) == before + 1)
+
+
+def release_and_wait(scheduler: FairScheduler, lane: str, granted: list):
+    """Release one slot and wait for the grant it hands out, if any."""
+    expected = len(granted) + (1 if waiting(scheduler, INTERACTIVE) + waiting(scheduler, BULK) else 0)
+    scheduler.release(lane)
+    wait_until(lambda: len(granted) == expected)
+
+
+def test_bulk_limit_keeps_reserved_share_for_interactive():
+    scheduler = FairScheduler(budget=4, reserved=0.25)
+    assert scheduler.bulk_limit == 3
+    for _ in range(3):
+        scheduler.acquire("a", BULK)
+
+    granted = []
+    queue_waiter(scheduler, "b", BULK, granted)
+    # The fourth slot is free but reserved
+    assert scheduler.stats()["active"] == 3
+
+    scheduler.acquire("c", INTERACTIVE)
+    assert scheduler.active == {INTERACTIVE: 1, BULK: 3}
+
+    # Freeing the interactive slot doesn't let bulk past its limit
+    scheduler.release(INTERACTIVE)
+    assert granted == [] and waiting(scheduler, BULK) == 1
+
+    release_and_wait(scheduler, BULK, granted)
+    assert granted == ["b"]
+    assert scheduler.active == {INTERACTIVE: 0, BULK: 3}
+
+
+def test_bulk_limit_is_at_least_one_slot():
+    assert FairScheduler(budget=1, reserved=0.9).bulk_limit == 1
+
+
+def test_interactive_waiters_are_granted_first():
+    scheduler = FairScheduler(budget=2, reserved=0)
+    scheduler.acquire("a", BULK)
+    scheduler.acquire("a", BULK)
+
+    granted = []
+    queue_waiter(scheduler, "b", BULK, granted, "bulk")
+    queue_waiter(scheduler, "c", INTERACTIVE, granted, "interactive")
+
+    release_and_wait(scheduler, BULK, granted)
+    assert granted == ["interactive"]
+    release_and_wait(scheduler, BULK, granted)
+    assert granted == ["interactive", "bulk"]
+
+
+def test_waiters_are_granted_round_robin_by_user():
+    scheduler = FairScheduler(budget=1, reserved=0)
+    scheduler.acquire("held", BULK)
+
+    granted = []
+    for i in range(3):
+        queue_waiter(scheduler, "a", BULK, granted, f"a{i}")
+    queue_waiter(scheduler, "b", BULK, granted, "b0")
+    queue_waiter(scheduler, "c", BULK, granted, "c0")
+
+    for _ in range(5):
+        release_and_wait(scheduler, BULK, granted)
+    # a's queued calls don't hold back b and c for more than one turn
+    assert granted == ["a0", "b0", "c0", "a1", "a2"]
+
+
+def test_new_requests_do_not_overtake_waiters():
+    scheduler = FairScheduler(budget=2, reserved=0.5)
+    scheduler.acquire("a", BULK)
+
+    granted = []
+    queue_waiter(scheduler, "b", BULK, granted)
+    queue_waiter(scheduler, "c", BULK, granted)
+    # Bulk waiters don't hold up interactive calls while there is room
+    scheduler.acquire("d", INTERACTIVE)
+
+    release_and_wait(scheduler, BULK, granted)
+    assert granted == ["b"]
+    # A later bulk arrival queues behind c instead of taking the next slot
+    queue_waiter(scheduler, "e", BULK, granted)
+    release_and_wait(scheduler, BULK, granted)
+    assert granted == ["b", "c"]
+    assert scheduler.stats()["lanes"][BULK]["backlog"] == {"e": 1}
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import pytest
+
+import garmin_service
+
+TODAY = date.today()
+
+
+def day(days_ago: int) -> str:
+    return (TODAY - timedelta(days=days_ago)).isoformat()
+
+
+class PlaceholderClient:
+    """Garmin stand-in that answers `pending` days like a device that hasn't uploaded."""
+
+    def __init__(self, pending):
+        self.pending = set(pending)
+
+    def get_sleep_data(self, d):
+        sleep = {"calendarDate": d, "sleepTimeSeconds": None if d in self.pending else 28000}
+        return {"dailySleepDTO": sleep}
+
+    def get_spo2_data(self, d):
+        return {"calendarDate": d, "averageSpO2": None}
+
+    def get_heart_rates(self, d):
+        return {"calendarDate": d, "heartRateValues": None if d in self.pending else [[1_700_000_000_000, 60]]}
+
+    def get_user_summary(self, d):
+        return {"calendarDate": d, "totalSteps": None if d in self.pending else 0}
+
+    def get_stress_data(self, d):
+        return {"calendarDate": d, "overallStressLevel": None if d in self.pending else 30}
+
+    def get_body_battery(self, start, end):
+        days = garmin_service.date_range(start, end)
+        return [{"date": d, "bodyBatteryLevel": "x"} for d in days if d not in self.pending]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    client = PlaceholderClient(pending=())
+    monkeypatch.setattr(garmin_service, "USER_TOKENSTORE_BASE", str(tmp_path))
+    monkeypatch.setattr(garmin_service, "CACHE_DISABLED", True)
+    monkeypatch.setattr(garmin_service, "EMPTY_DAY_GRACE_DAYS", 14)
+    monkeypatch.setattr(garmin_service, "get_client", lambda user_id=None: client)
+    # Skip the upstream rate limits
+    monkeypatch.setattr(garmin_service, "upstream",
+                        lambda client, user_id, method, *args: getattr(client, method)(*args))
+    (tmp_path / "user").mkdir()
+    return client
+
+
+def test_placeholder_days_hold_watermarks_during_the_grace_period(client):
+    client.pending = {day(5), day(20)}
+    result = garmin_service.sync_incremental("user", start_date=day(25))
+    assert result["success"]
+    # Day 20 is past the grace period, day 5 may still be uploaded
+    assert result["watermarks"] == dict.fromkeys(garmin_service.SYNC_METRICS, day(6))
+    assert result["dates"][day(5)]["sleep"]["sleepTimeSeconds"] is None
+
+    # The late upload is picked up and the watermarks move past it
+    client.pending = set()
+    result = garmin_service.sync_incremental("user")
+    assert result["range"]["start_date"] == day(5)
+    assert result["dates"][day(5)]["sleep"]["sleepTimeSeconds"] == 28000
+    assert result["watermarks"] == dict.fromkeys(garmin_service.SYNC_METRICS, day(2))
+
+
+def test_zero_values_count_as_data(client):
+    result = garmin_service.sync_incremental("user", start_date=day(4))
+    assert result["dates"][day(4)]["activity"]["totalSteps"] == 0
+    assert result["watermarks"]["activity"] == day(2)
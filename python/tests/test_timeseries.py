@@ -0,0 +1,113 @@
+import pytest
+
+from garmin_service import InvalidOptions, series_options
+from timeseries import decode_compact, encode_compact, lttb, window_stats
+
+MINUTE = 60 * 1000
+# Garmin timestamps are epoch milliseconds; 0 counts as missing
+T0 = 1_700_000_000_000
+
+
+def test_compact_round_trip_with_even_spacing():
+    points = [[1000, 60], [3000, 62], [5000, None], [7000, 58]]
+    encoded = encode_compact(points)
+    assert encoded == {"encoding": "delta", "start": 1000, "interval": 2000, "values": [60, 2, None, -4]}
+    assert decode_compact(encoded) == points
+
+
+def test_compact_round_trip_with_uneven_spacing():
+    points = [[1000, 60], [2000, 61], [4500, 61], [4600, 70]]
+    encoded = encode_compact(points)
+    assert encoded["timestamps"] == [1000, 2500, 100]
+    assert "interval" not in encoded
+    assert decode_compact(encoded) == points
+
+
+def test_compact_drops_points_without_timestamp():
+    encoded = encode_compact([[None, 50], None, [1000, 55]])
+    assert encoded == {"encoding": "delta", "start": 1000, "interval": None, "values": [55]}
+    assert decode_compact(encoded) == [[1000, 55]]
+
+
+def test_compact_empty_series():
+    encoded = encode_compact([])
+    assert encoded["values"] == []
+    assert decode_compact(encoded) == []
+
+
+def hr_series(n: int, gap_every: int = 0) -> list:
+    return [[T0 + i * MINUTE, None if gap_every and i % gap_every == gap_every - 1 else 60 + i % 7]
+            for i in range(n)]
+
+
+def test_lttb_returns_series_that_fit_unchanged():
+    points = hr_series(50, gap_every=10) + [[None, 70]]
+    assert lttb(points, 51) is points
+    assert lttb(points, 100) is points
+
+
+def test_lttb_keeps_ends_and_extremes():
+    points = hr_series(100)
+    points[40][1] = 150
+    sampled = lttb(points, 10)
+    assert len(sampled) == 10
+    assert (sampled[0], sampled[-1]) == (points[0], points[-1])
+    assert [T0 + 40 * MINUTE, 150] in sampled
+
+
+def test_lttb_does_not_join_across_gaps():
+    points = hr_series(100, gap_every=25)
+    sampled = lttb(points, 20)
+    assert len(sampled) <= 20
+    # One gap point between each of the four segments
+    assert [p[0] for p in sampled if p[1] is None] == [T0 + 24 * MINUTE, T0 + 49 * MINUTE, T0 + 74 * MINUTE]
+    assert sampled[-1] == points[98]
+
+
+def test_lttb_drops_the_shortest_segments_when_gaps_dont_fit():
+    points = hr_series(30, gap_every=3)  # ten segments of two points
+    points[-1][1] = 60
+    sampled = lttb(points, 5)
+    assert len(sampled) == 5
+    assert sum(p[1] is None for p in sampled) == 2
+    assert all(a[1] is not None or b[1] is not None for a, b in zip(sampled, sampled[1:]))
+
+
+@pytest.mark.parametrize("max_points", [1, 2, "x", -3])
+def test_series_options_reject_unusable_max_points(max_points):
+    with pytest.raises(InvalidOptions):
+        series_options({"max_points": max_points})
+
+
+def test_series_options():
+    assert series_options({"max_points": "3", "resolution": "60", "hr_format": "compact"}) == {
+        "max_points": 3, "resolution": 60.0, "hr_format": "compact"}
+
+
+def test_window_stats():
+    points = [[T0 + i * MINUTE, v] for i, v in enumerate([70, 60, 50, None, 40, 0, 80, 90, 100])]
+    stats = window_stats(points, T0 + MINUTE, T0 + 7 * MINUTE)
+    # 60, 50, 40, 80, 90: gaps (None/0) and points outside the window are dropped
+    assert stats["avg"] == 64
+    assert (stats["min"], stats["max"]) == (40, 90)
+    assert (stats["p10"], stats["p50"], stats["p90"]) == (44, 60, 86)
+    # Lowest mean over a full 3-minute span: [2, 5) holds 50 and 40
+    assert window_stats(points, T0 + MINUTE, T0 + 7 * MINUTE, rolling_ms=3 * MINUTE)["lowestRolling"] == 45
+
+
+def test_window_stats_short_window_uses_mean():
+    points = [[T0, 50], [T0 + MINUTE, 70]]
+    assert window_stats(points, T0, T0 + MINUTE, rolling_ms=10 * MINUTE)["lowestRolling"] == 60
+
+
+def test_window_stats_empty_window():
+    points = [[T0, 50], [T0 + MINUTE, None]]
+    assert window_stats(points, T0 + MINUTE, T0 + 2 * MINUTE) is None
+    assert window_stats(None, T0, T0 + MINUTE) is None
+
+
+def test_window_stats_without_comparable_timestamps():
+    points = [[T0 + 2 * MINUTE, 70], [None, 99], None, [T0, 50], [T0 + MINUTE, 60]]
+    stats = window_stats(points, T0, T0 + 2 * MINUTE, rolling_ms=2 * MINUTE)
+    assert (stats["avg"], stats["min"], stats["max"]) == (60, 50, 70)
+    assert stats["lowestRolling"] == 55
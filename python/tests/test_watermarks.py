@@ -0,0 +1,40 @@
+from watermarks import advance, load_watermarks, needs_sync, next_day, save_watermarks
+
+
+def test_advance_starts_at_the_sync_start():
+    marks = {}
+    assert not advance(marks, "sleep", "2024-03-02", "2024-03-01")
+    assert advance(marks, "sleep", "2024-03-01", "2024-03-01")
+    assert marks == {"sleep": "2024-03-01"}
+
+
+def test_advance_only_moves_to_the_next_day():
+    marks = {"sleep": "2024-02-28"}
+    # A gap (2024-02-29 missing) holds the watermark back
+    assert not advance(marks, "sleep", "2024-03-01", "2024-01-01")
+    assert advance(marks, "sleep", "2024-02-29", "2024-01-01")
+    assert advance(marks, "sleep", "2024-03-01", "2024-01-01")
+    # Days at or before the watermark don't move it
+    assert not advance(marks, "sleep", "2024-02-29", "2024-01-01")
+    assert marks == {"sleep": "2024-03-01"}
+
+
+def test_advance_is_per_metric():
+    marks = {"sleep": "2024-03-01"}
+    assert advance(marks, "stress", "2024-02-01", "2024-02-01")
+    assert marks == {"sleep": "2024-03-01", "stress": "2024-02-01"}
+
+
+def test_needs_sync_and_next_day():
+    marks = {"sleep": "2024-12-31"}
+    assert next_day("2024-12-31") == "2025-01-01"
+    assert needs_sync(marks, "sleep", "2025-01-01")
+    assert not needs_sync(marks, "sleep", "2024-12-31")
+    assert needs_sync(marks, "stress", "2000-01-01")
+
+
+def test_save_never_moves_a_watermark_backwards(tmp_path):
+    save_watermarks(str(tmp_path), {"sleep": "2024-03-05", "stress": "2024-03-01"})
+    saved = save_watermarks(str(tmp_path), {"sleep": "2024-03-02", "stress": "2024-03-03"})
+    assert saved == {"sleep": "2024-03-05", "stress": "2024-03-03"}
+    assert load_watermarks(str(tmp_path)) == saved
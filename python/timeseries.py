@@ -0,0 +1,264 @@
+"""
+Time-series helpers for Garmin `[timestamp, value]` series.
+
+`window_stats` summarizes the samples between two timestamps: the window
+is found by binary search on the timestamps, and the statistics take one
+sort and one pass over it. The rest shrinks heart-rate series before they
+are returned: shape-preserving downsampling (LTTB) and a compact delta
+encoding.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+# Width of the rolling window used for the lowest sustained value
+ROLLING_WINDOW_MS = 5 * 60 * 1000
+
+_timestamp = itemgetter(0)
+
+
+def window(points, start, end) -> tuple:
+    """(timestamps, values) of the points with start <= timestamp <= end.
+
+    Points with a missing/zero value are dropped, matching how Garmin marks
+    gaps in heart-rate and body-battery series. Series come from Garmin in
+    time order, so the window is found by binary search; series with
+    missing timestamps are filtered and sorted instead.
+    """
+    points = points or []
+    try:
+        lo = bisect_left(points, start, key=_timestamp)
+        hi = bisect_right(points, end, lo, key=_timestamp)
+    except TypeError:
+        # None entries or timestamps can't be compared
+        inside = sorted(
+            (p for p in points if p and p[0] and p[1] and start <= p[0] <= end),
+            key=_timestamp,
+        )
+        return [p[0] for p in inside], [p[1] for p in inside]
+
+    timestamps, values = [], []
+    for p in points[lo:hi]:
+        if p and p[0] and p[1]:
+            timestamps.append(p[0])
+            values.append(p[1])
+    return timestamps, values
+
+
+def window_stats(points, start, end, rolling_ms: int = ROLLING_WINDOW_MS):
+    """Summary of the values between start and end, or None if empty.
+
+    Returns avg, min, max, p10/p50/p90 and `lowestRolling`, the lowest
+    mean over any full `rolling_ms` span inside the window.
+    """
+    t, v = window(points, start, end)
+    if not v:
+        return None
+
+    # One sort gives min, max and the percentiles
+    ordered = sorted(v)
+    p10, p50, p90 = _percentiles(ordered, (0.1, 0.5, 0.9))
+    return {
+        "avg": round(sum(v) / len(v)),
+        "min": int(ordered[0]),
+        "max": int(ordered[-1]),
+        "p10": round(p10),
+        "p50": round(p50),
+        "p90": round(p90),
+        "lowestRolling": _lowest_rolling_mean(t, v, rolling_ms),
+    }
+
+
+def _percentiles(ordered, quantiles) -> list:
+    """Linearly interpolated percentiles of an already sorted list."""
+    last = len(ordered) - 1
+    result = []
+    for q in quantiles:
+        pos = q * last
+        lo = int(pos)
+        hi = min(lo + 1, last)
+        result.append(float(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)))
+    return result
+
+
+def _lowest_rolling_mean(t, v, width_ms: int):
+    """Lowest mean of the samples in [t_i, t_i + width) for windows that fit."""
+    # Windows starting after `limit` would run past the last sample
+    limit = t[-1] + 1 - width_ms
+    if t[0] > limit:
+        return round(sum(v) / len(v))
+
+    # Two pointers: the window [i, j) slides forward with a running total
+    j, total, lowest = 0, 0, math.inf
+    for i, start in enumerate(t):
+        if start > limit:
+            break
+        edge = start + width_ms
+        while j < len(t) and t[j] < edge:
+            total += v[j]
+            j += 1
+        mean = total / (j - i)
+        if mean < lowest:
+            lowest = mean
+        total -= v[i]
+    return round(lowest)
+
+
+def lttb(points: list, max_points: int) -> list:
+    """Downsample [t, v] points with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point and, from each bucket in between, the
+    point that forms the largest triangle with its neighbours, which
+    preserves peaks and troughs far better than plain striding. Gaps (a
+    missing value) split the series into segments that share the budget
+    by length and are downsampled separately, with one [t, None] point
+    kept between them so the result is never joined across a gap; when
+    there are too many segments to fit, the shortest become part of the
+    gaps around them. Points without a timestamp are dropped. A series
+    that already fits in `max_points` (or `max_points` < 3) is returned
+    unchanged.
+    """
+    if max_points >= len(points) or max_points < 3:
+        return points
+
+    segments, gaps = _segments(points)
+    # Each kept segment needs a point, and a gap point before all but the first
+    kept = sorted(range(len(segments)), key=lambda i: len(segments[i]), reverse=True)
+    kept = sorted(kept[:(max_points + 1) // 2])
+    spare = max_points - 2 * len(kept) + 1
+    total = sum(len(segments[i]) for i in kept)
+
+    sampled = []
+    for previous, i in zip([None] + kept, kept):
+        if previous is not None:
+            sampled.append(gaps[previous])
+        segment = segments[i]
+        sampled.extend(_lttb_segment(segment, 1 + spare * len(segment) // total))
+    return sampled
+
+
+def _segments(points: list) -> tuple:
+    """Split points into runs without gaps, and the first gap point between each pair of runs."""
+    segments, gaps = [], []
+    segment, gap = [], None
+    for p in points:
+        if not p or p[0] is None:
+            continue
+        if p[1] is None:
+            gap = gap or p
+        else:
+            if gap and segment:
+                segments.append(segment)
+                gaps.append(gap)
+                segment = []
+            gap = None
+            segment.append(p)
+    if segment:
+        segments.append(segment)
+    return segments, gaps
+
+
+def _lttb_segment(points: list, max_points: int) -> list:
+    """LTTB of a series without gaps; fewer than 3 points keeps its ends."""
+    n = len(points)
+    if max_points >= n:
+        return points
+    if max_points < 3:
+        return [points[0], points[-1]][:max_points]
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (max_points - 2)
+    a = 0  # index of the previously selected point
+
+    for i in range(max_points - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_t = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_v = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        at, av = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            t, v = points[j]
+            area = abs((at - avg_t) * (v - av) - (at - t) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def encode_compact(points: list) -> dict:
+    """Delta-encode [t, v] points.
+
+    Returns {"encoding": "delta", "start", "interval", "values"} when the
+    timestamps are evenly spaced, otherwise "timestamps" holds the deltas
+    between consecutive timestamps instead of "interval". Each entry of
+    "values" is the change from the previous non-null value (the first is
+    absolute); missing values stay null.
+    """
+    points = [p for p in points if p and p[0] is not None]
+    if not points:
+        return {"encoding": "delta", "start": None, "interval": None, "values": []}
+
+    timestamps = [p[0] for p in points]
+    steps = [b - a for a, b in zip(timestamps, timestamps[1:])]
+
+    values = []
+    previous = 0
+    for _, v in points:
+        if v is None:
+            values.append(None)
+        else:
+            values.append(v - previous)
+            previous = v
+
+    encoded = {"encoding": "delta", "start": timestamps[0]}
+    if len(set(steps)) <= 1:
+        encoded["interval"] = steps[0] if steps else None
+    else:
+        encoded["timestamps"] = steps
+    encoded["values"] = values
+    return encoded
+
+
+def decode_compact(encoded: dict) -> list:
+    """Inverse of encode_compact; returns [t, v] points."""
+    values = encoded.get("values") or []
+    if not values:
+        return []
+
+    if "timestamps" in encoded:
+        timestamps = [encoded["start"]]
+        for step in encoded["timestamps"]:
+            timestamps.append(timestamps[-1] + step)
+    else:
+        interval = encoded.get("interval") or 0
+        timestamps = [encoded["start"] + i * interval for i in range(len(values))]
+
+    points = []
+    current = 0
+    for t, delta in zip(timestamps, values):
+        if delta is None:
+            points.append([t, None])
+        else:
+            current += delta
+            points.append([t, current])
+    return points
+
+
+def points_for_resolution(points: list, resolution: float) -> int:
+    """Number of points that covers the series at one point per `resolution` seconds."""
+    timestamps = [p[0] for p in points if p and p[0] is not None]
+    if len(timestamps) < 2 or not resolution:
+        return len(timestamps)
+    span_seconds = (timestamps[-1] - timestamps[0]) / 1000
+    return max(3, int(span_seconds / resolution) + 1)
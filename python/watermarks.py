@@ -0,0 +1,64 @@
+"""
+Per-user, per-metric sync watermarks.
+
+A watermark is the last date up to which a metric has been synced with
+finalized data and no gaps, so incremental syncs only need to fetch the
+days after it. Watermarks are stored as JSON next to the user's tokens.
+"""
+import json
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from atomic_json import atomic_write_json
+
+WATERMARKS_FILE = "sync_watermarks.json"
+
+_lock = threading.Lock()
+
+
+def load_watermarks(tokenstore: str) -> dict:
+    """Return {metric: "YYYY-MM-DD"} for a user, empty if never synced."""
+    try:
+        with open(Path(tokenstore) / WATERMARKS_FILE) as f:
+            marks = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return marks if isinstance(marks, dict) else {}
+
+
+def save_watermarks(tokenstore: str, marks: dict) -> dict:
+    """Persist watermarks, never moving one backwards; returns what was saved."""
+    with _lock:
+        # Another process may have advanced some metrics meanwhile
+        merged = load_watermarks(tokenstore)
+        for metric, day in marks.items():
+            if day and (not merged.get(metric) or day > merged[metric]):
+                merged[metric] = day
+
+        atomic_write_json(Path(tokenstore) / WATERMARKS_FILE, merged)
+    return merged
+
+
+def next_day(day: str) -> str:
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def needs_sync(marks: dict, metric: str, day: str) -> bool:
+    """Whether `day` is past the metric's watermark."""
+    mark = marks.get(metric)
+    return not mark or day > mark
+
+
+def advance(marks: dict, metric: str, day: str, start_date: str) -> bool:
+    """Move the metric's watermark to `day` if it directly follows it.
+
+    With no watermark yet, the first day of the sync (`start_date`) starts
+    the run. Returns True if the watermark moved.
+    """
+    mark = marks.get(metric)
+    expected = next_day(mark) if mark else start_date
+    if day != expected:
+        return False
+    marks[metric] = day
+    return True
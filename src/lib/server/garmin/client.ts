@@ -1,4 +1,5 @@
-import { spawn } from 'child_process';
+import { spawn, type ChildProcessWithoutNullStreams } from 'child_process';
+import { createInterface } from 'readline';
 import { join } from 'path';
 import { env } from '$env/dynamic/private';
 
@@ -73,21 +74,57 @@ interface StressData {
 	stressQualifier: string;
 }
 
+interface SyncDay {
+	sleep: SleepData | null;
+	activity: ActivityData | null;
+	stress: StressData | null;
+	bodyBattery: unknown[];
+	heartRate: unknown;
+	// Content hash per metric; send back as known_hashes to skip unchanged days
+	hashes?: Record<string, string>;
+	// Metrics whose hash matched known_hashes; their value is null
+	notModified?: string[];
+}
+
 interface SyncAllResult {
 	success: boolean;
-	dates?: Record<
-		string,
-		{
-			sleep: SleepData | null;
-			activity: ActivityData | null;
-			stress: StressData | null;
-			bodyBattery: unknown[];
-			heartRate: unknown;
-		}
-	>;
+	dates?: Record<string, SyncDay>;
 	error?: string;
 }
 
+// Server-side shaping of heart-rate series (LTTB downsampling, delta encoding)
+interface HeartRateSeriesOptions {
+	hr_format?: 'pairs' | 'compact';
+	max_points?: number;
+	resolution?: number;
+}
+
+interface SyncIncrementalResult extends SyncAllResult {
+	range?: { start_date: string; end_date: string };
+	// Last finalized, gap-free synced date per metric
+	watermarks?: Record<string, string>;
+}
+
+// Lines emitted by the streaming sync: one per day, then a final status line
+type SyncStreamRecord =
+	| { date: string; data: SyncDay }
+	| { success: boolean; done?: boolean; days?: number; error?: string };
+
+// Rolling aggregates kept by the service as days are synced
+interface AggregateWindow {
+	value: number | null;
+	// Days in the window that had data
+	days: number;
+}
+
+interface HealthAggregates {
+	// Last synced day the windows end at
+	asOf: string | null;
+	windows: number[];
+	// Per series, e.g. restingHeartRate.windows['7d']
+	metrics: Record<string, { reduction: 'mean' | 'sum'; windows: Record<string, AggregateWindow> }>;
+}
+
 interface Activity {
 	activityId: number;
 	activityName: string;
@@ -103,6 +140,23 @@ interface Activity {
 	steps: number;
 }
 
+// How long a call keeps retrying while the service answers 429 (bulk slots busy)
+const BUSY_RETRY_MAX_MS = Number(env.GARMIN_BUSY_RETRY_MAX_MS) || 120_000;
+
+// POST to the service, waiting out 429s for as long as their Retry-After asks
+async function postToService(url: string, init: RequestInit): Promise<Response> {
+	const deadline = Date.now() + BUSY_RETRY_MAX_MS;
+	while (true) {
+		const response = await fetch(url, init);
+		if (response.status !== 429) return response;
+		// Jittered so callers turned away together don't all come back at once
+		const delayMs = (Number(response.headers.get('Retry-After')) || 1) * 1000 * (1 + Math.random() * 0.2);
+		if (Date.now() + delayMs > deadline) return response;
+		await response.body?.cancel();
+		await new Promise((resolve) => setTimeout(resolve, delayMs));
+	}
+}
+
 // HTTP client for deployed service
 async function callHttpService<T>(endpoint: string, body: Record<string, unknown>): Promise<T> {
 	const serviceUrl = env.GARMIN_SERVICE_URL;
@@ -120,7 +174,7 @@ async function callHttpService<T>(endpoint: string, body: Record<string, unknown
 		headers['Authorization'] = `Bearer ${apiKey}`;
 	}
 
-	const response = await fetch(`${serviceUrl}${endpoint}`, {
+	const response = await postToService(`${serviceUrl}${endpoint}`, {
 		method: 'POST',
 		headers,
 		body: JSON.stringify(body)
@@ -133,44 +187,214 @@ async function callHttpService<T>(endpoint: string, body: Record<string, unknown
 	return response.json();
 }
 
+// Split a byte stream into non-empty lines
+async function* readLines(chunks: AsyncIterable<Uint8Array | string>): AsyncGenerator<string> {
+	const decoder = new TextDecoder();
+	let buffer = '';
+
+	for await (const chunk of chunks) {
+		buffer += typeof chunk === 'string' ? chunk : decoder.decode(chunk, { stream: true });
+		let newline = buffer.indexOf('\n');
+		while (newline >= 0) {
+			const line = buffer.slice(0, newline).trim();
+			buffer = buffer.slice(newline + 1);
+			if (line) yield line;
+			newline = buffer.indexOf('\n');
+		}
+	}
+
+	buffer += decoder.decode();
+	if (buffer.trim()) yield buffer.trim();
+}
+
+// Streaming (NDJSON) variant of callHttpService
+async function* streamHttpService<T>(
+	endpoint: string,
+	body: Record<string, unknown>
+): AsyncGenerator<T> {
+	const serviceUrl = env.GARMIN_SERVICE_URL;
+	const apiKey = env.GARMIN_SERVICE_API_KEY;
+
+	if (!serviceUrl) {
+		throw new Error('GARMIN_SERVICE_URL not configured');
+	}
+
+	const headers: Record<string, string> = {
+		'Content-Type': 'application/json',
+		Accept: 'application/x-ndjson'
+	};
+
+	if (apiKey) {
+		headers['Authorization'] = `Bearer ${apiKey}`;
+	}
+
+	const response = await postToService(`${serviceUrl}${endpoint}`, {
+		method: 'POST',
+		headers,
+		body: JSON.stringify({ ...body, stream: true })
+	});
+
+	if (!response.ok || !response.body) {
+		throw new Error(`Garmin service error: ${response.status}`);
+	}
+
+	for await (const line of readLines(response.body as unknown as AsyncIterable<Uint8Array>)) {
+		yield JSON.parse(line) as T;
+	}
+}
+
+// Persistent local worker (`garmin_service.py serve`) speaking line-delimited
+// JSON-RPC, so each call skips interpreter startup, imports and token login.
+interface PendingCall {
+	resolve: (result: unknown) => void;
+	reject: (error: Error) => void;
+	onPartial?: (record: unknown) => void;
+	timer?: ReturnType<typeof setTimeout>;
+}
+
+interface WorkerMessage {
+	id: number | null;
+	result?: unknown;
+	partial?: unknown;
+	error?: { code: number; message: string };
+}
+
+let worker: ChildProcessWithoutNullStreams | null = null;
+let nextRequestId = 1;
+const pendingCalls = new Map<number, PendingCall>();
+
+// A call that gets no reply (or, when streaming, no record) for this long fails
+const WORKER_CALL_TIMEOUT_MS = Number(env.GARMIN_WORKER_TIMEOUT_MS) || 120_000;
+
+function armTimeout(id: number, call: PendingCall) {
+	clearTimeout(call.timer);
+	call.timer = setTimeout(() => {
+		pendingCalls.delete(id);
+		call.reject(new Error(`Garmin worker did not respond within ${WORKER_CALL_TIMEOUT_MS} ms`));
+	}, WORKER_CALL_TIMEOUT_MS);
+}
+
+function startWorker(): ChildProcessWithoutNullStreams {
+	const pythonScript = join(process.cwd(), 'python', 'garmin_service.py');
+	// Use venv Python if available, otherwise fall back to system Python
+	const venvPython = join(process.cwd(), '.venv', 'bin', 'python');
+	const proc = spawn(venvPython, [pythonScript, 'serve']);
+
+	let stderrTail = '';
+	proc.stderr.on('data', (data) => {
+		stderrTail = (stderrTail + data.toString()).slice(-4000);
+	});
+
+	createInterface({ input: proc.stdout }).on('line', (line) => {
+		let message: WorkerMessage;
+		try {
+			message = JSON.parse(line);
+		} catch {
+			return;
+		}
+		if (message.id === null) return;
+		const call = pendingCalls.get(message.id);
+		if (!call) return;
+
+		if ('partial' in message) {
+			armTimeout(message.id, call);
+			call.onPartial?.(message.partial);
+			return;
+		}
+		pendingCalls.delete(message.id);
+		clearTimeout(call.timer);
+		if (message.error) {
+			call.reject(new Error(message.error.message));
+		} else {
+			call.resolve(message.result);
+		}
+	});
+
+	const fail = (error: Error) => {
+		if (worker === proc) worker = null;
+		for (const call of pendingCalls.values()) {
+			clearTimeout(call.timer);
+			call.reject(error);
+		}
+		pendingCalls.clear();
+	};
+	// Write errors (EPIPE) mean the worker died; 'close' rejects the pending calls
+	proc.stdin.on('error', () => {});
+	proc.on('error', (err) => fail(new Error(`Failed to spawn Python process: ${err.message}`)));
+	proc.on('close', (code) => fail(new Error(stderrTail || `Python worker exited with code ${code}`)));
+
+	return proc;
+}
+
+function getWorker(): ChildProcessWithoutNullStreams {
+	if (!worker) {
+		worker = startWorker();
+	}
+	return worker;
+}
+
+process.once('exit', () => worker?.kill());
+
+function callWorker<T>(
+	command: string,
+	args: Record<string, unknown>,
+	onPartial?: (record: unknown) => void
+): Promise<T> {
+	return new Promise((resolve, reject) => {
+		const id = nextRequestId++;
+		const call: PendingCall = { resolve: resolve as (result: unknown) => void, reject, onPartial };
+		pendingCalls.set(id, call);
+		armTimeout(id, call);
+		getWorker().stdin.write(
+			JSON.stringify({ jsonrpc: '2.0', id, method: command, params: args }) + '\n'
+		);
+	});
+}
+
+// Streaming variant of runPythonCommand: yields each record as the worker sends it
+async function* streamPythonCommand<T>(
+	command: string,
+	args: Record<string, unknown> = {}
+): AsyncGenerator<T> {
+	const queue: T[] = [];
+	let finished = false;
+	let failure: Error | null = null;
+	let wake: (() => void) | null = null;
+
+	callWorker(command, args, (record) => {
+		queue.push(record as T);
+		wake?.();
+	}).then(
+		() => {
+			finished = true;
+			wake?.();
+		},
+		(err: Error) => {
+			failure = err;
+			finished = true;
+			wake?.();
+		}
+	);
+
+	while (true) {
+		const next = queue.shift();
+		if (next !== undefined) {
+			yield next;
+			continue;
+		}
+		if (failure) throw failure;
+		if (finished) return;
+		await new Promise<void>((resolve) => (wake = resolve));
+		wake = null;
+	}
+}
+
 // Subprocess client for local development
 async function runPythonCommand<T>(
 	command: string,
 	args: Record<string, unknown> = {}
 ): Promise<T> {
-	return new Promise((resolve, reject) => {
-		const pythonScript = join(process.cwd(), 'python', 'garmin_service.py');
-		// Use venv Python if available, otherwise fall back to system Python
-		const venvPython = join(process.cwd(), '.venv', 'bin', 'python');
-		const proc = spawn(venvPython, [pythonScript, command, JSON.stringify(args)]);
-
-		let stdout = '';
-		let stderr = '';
-
-		proc.stdout.on('data', (data) => {
-			stdout += data.toString();
-		});
-
-		proc.stderr.on('data', (data) => {
-			stderr += data.toString();
-		});
-
-		proc.on('close', (code) => {
-			if (code === 0) {
-				try {
-					resolve(JSON.parse(stdout));
-				} catch {
-					reject(new Error('Failed to parse Python response'));
-				}
-			} else {
-				reject(new Error(stderr || `Python script exited with code ${code}`));
-			}
-		});
-
-		proc.on('error', (err) => {
-			reject(new Error(`Failed to spawn Python process: ${err.message}`));
-		});
-	});
+	return callWorker<T>(command, args);
 }
 
 // Check if we should use HTTP or subprocess
@@ -235,6 +459,28 @@ export const garminClient = {
 		return runPythonCommand('sync_all', { start_date: startDate, end_date: endDate, user_id: userId });
 	},
 
+	// Fetches only days after each metric's stored watermark
+	syncIncremental: async (userId?: string, endDate?: string): Promise<SyncIncrementalResult> => {
+		if (useHttpService()) {
+			return callHttpService('/sync-incremental', { user_id: userId, end_date: endDate });
+		}
+		return runPythonCommand('sync_incremental', { user_id: userId, end_date: endDate });
+	},
+
+	// Yields each day as soon as the service has finished fetching it
+	syncAllStream: (
+		startDate: string,
+		endDate: string,
+		userId?: string,
+		options: HeartRateSeriesOptions = {}
+	): AsyncGenerator<SyncStreamRecord> => {
+		const args = { start_date: startDate, end_date: endDate, user_id: userId, ...options };
+		if (useHttpService()) {
+			return streamHttpService('/sync-all', args);
+		}
+		return streamPythonCommand('sync_all_stream', args);
+	},
+
 	fetchActivities: async (date: string, userId?: string): Promise<GarminResult<Activity[]>> => {
 		if (useHttpService()) {
 			return callHttpService('/activities', { date, user_id: userId });
@@ -242,6 +488,14 @@ export const garminClient = {
 		return runPythonCommand('fetch_activities', { date, user_id: userId });
 	},
 
+	// Instant: read from the service's stored aggregates, no Garmin calls
+	fetchAggregates: async (userId?: string): Promise<GarminResult<HealthAggregates>> => {
+		if (useHttpService()) {
+			return callHttpService('/aggregates', { user_id: userId });
+		}
+		return runPythonCommand('fetch_aggregates', { user_id: userId });
+	},
+
 	fetchActivitiesBatch: async (
 		startDate: string,
 		endDate: string,
@@ -254,5 +508,14 @@ export const garminClient = {
 	}
 };
 
-export type { Activity };
-export type { SleepData, ActivityData, StressData, SyncAllResult };
+export type { Activity, HealthAggregates };
+export type {
+	SleepData,
+	ActivityData,
+	StressData,
+	SyncAllResult,
+	SyncDay,
+	HeartRateSeriesOptions,
+	SyncIncrementalResult,
+	SyncStreamRecord
+};
@@ -1,11 +1,12 @@
 import { db } from '$lib/server/db/client';
 import { sleepData, activitySummary, stressData } from '$lib/server/db/schema';
-import { garminClient, type SyncAllResult } from './client';
+import { garminClient, type SyncDay } from './client';
 import { eq } from 'drizzle-orm';
 
 /**
  * Sync Garmin data for a date range and store in database.
  * Data is already de-personalized by the Python service.
+ * Days are streamed from the service and stored as they arrive.
  */
 export async function syncGarminData(
 	startDate: string,
@@ -16,123 +17,145 @@ export async function syncGarminData(
 	let synced = 0;
 
 	try {
-		const result: SyncAllResult = await garminClient.syncAll(startDate, endDate, userId);
-
-		if (!result.success || !result.dates) {
-			return { success: false, synced: 0, errors: [result.error || 'Failed to sync'] };
+		// Heart-rate series aren't stored, so keep them small on the wire
+		const records = garminClient.syncAllStream(startDate, endDate, userId, {
+			hr_format: 'compact',
+			max_points: 300
+		});
+		// The service ends a complete stream with a {success, done} record
+		let done = false;
+		for await (const record of records) {
+			if ('date' in record) {
+				synced += await storeDay(record.date, record.data, errors);
+			} else if (!record.success) {
+				return { success: false, synced, errors: [...errors, record.error || 'Failed to sync'] };
+			} else if (record.done) {
+				done = true;
+			}
+		}
+		if (!done) {
+			return { success: false, synced, errors: [...errors, 'Sync stream ended early'] };
 		}
 
-		for (const [date, dayData] of Object.entries(result.dates)) {
-			// Store sleep data (only if we have actual data)
-			if (dayData.sleep && dayData.sleep.sleepTimeSeconds) {
-				try {
-					const sleepRecord = {
-						date,
-						startTime: dayData.sleep.sleepStartTimestampGMT
-							? new Date(dayData.sleep.sleepStartTimestampGMT)
-							: null,
-						endTime: dayData.sleep.sleepEndTimestampGMT
-							? new Date(dayData.sleep.sleepEndTimestampGMT)
-							: null,
-						durationSeconds: dayData.sleep.sleepTimeSeconds,
-						deepSleepSeconds: dayData.sleep.deepSleepSeconds,
-						lightSleepSeconds: dayData.sleep.lightSleepSeconds,
-						remSleepSeconds: dayData.sleep.remSleepSeconds,
-						awakeSeconds: dayData.sleep.awakeSleepSeconds,
-						sleepScore: dayData.sleep.sleepScore,
-						avgSpO2: dayData.sleep.averageSpO2Value,
-						avgRespirationRate: dayData.sleep.averageRespirationValue,
-						avgHrSleep: dayData.sleep.avgSleepHR,
-						rawData: JSON.stringify(dayData.sleep)
-					};
+		return { success: true, synced, errors };
+	} catch (e) {
+		return {
+			success: false,
+			synced,
+			errors: [...errors, e instanceof Error ? e.message : 'Unknown error']
+		};
+	}
+}
 
-					await db
-						.insert(sleepData)
-						.values(sleepRecord)
-						.onConflictDoUpdate({
-							target: sleepData.date,
-							set: sleepRecord
-						});
-					synced++;
-				} catch (e) {
-					errors.push(`Sleep ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
-				}
-			}
+/**
+ * Upsert one day of synced data. Returns the number of rows written and
+ * appends per-table failures to `errors`.
+ */
+async function storeDay(date: string, dayData: SyncDay, errors: string[]): Promise<number> {
+	let synced = 0;
 
-			// Store activity data
-			if (dayData.activity) {
-				try {
-					const activityRecord = {
-						date,
-						steps: dayData.activity.totalSteps,
-						distance: dayData.activity.totalDistanceMeters,
-						activeCalories: dayData.activity.activeKilocalories,
-						totalCalories: dayData.activity.totalKilocalories,
-						floorsClimbed: dayData.activity.floorsAscended,
-						avgHeartRate: Math.round(
-							(dayData.activity.minHeartRate + dayData.activity.maxHeartRate) / 2
-						),
-						maxHeartRate: dayData.activity.maxHeartRate,
-						restingHeartRate: dayData.activity.restingHeartRate,
-						rawData: JSON.stringify(dayData.activity)
-					};
+	// Store sleep data (only if we have actual data)
+	if (dayData.sleep && dayData.sleep.sleepTimeSeconds) {
+		try {
+			const sleepRecord = {
+				date,
+				startTime: dayData.sleep.sleepStartTimestampGMT
+					? new Date(dayData.sleep.sleepStartTimestampGMT)
+					: null,
+				endTime: dayData.sleep.sleepEndTimestampGMT
+					? new Date(dayData.sleep.sleepEndTimestampGMT)
+					: null,
+				durationSeconds: dayData.sleep.sleepTimeSeconds,
+				deepSleepSeconds: dayData.sleep.deepSleepSeconds,
+				lightSleepSeconds: dayData.sleep.lightSleepSeconds,
+				remSleepSeconds: dayData.sleep.remSleepSeconds,
+				awakeSeconds: dayData.sleep.awakeSleepSeconds,
+				sleepScore: dayData.sleep.sleepScore,
+				avgSpO2: dayData.sleep.averageSpO2Value,
+				avgRespirationRate: dayData.sleep.averageRespirationValue,
+				avgHrSleep: dayData.sleep.avgSleepHR,
+				rawData: JSON.stringify(dayData.sleep)
+			};
 
-					await db
-						.insert(activitySummary)
-						.values(activityRecord)
-						.onConflictDoUpdate({
-							target: activitySummary.date,
-							set: activityRecord
-						});
-					synced++;
-				} catch (e) {
-					errors.push(`Activity ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
-				}
-			}
+			await db
+				.insert(sleepData)
+				.values(sleepRecord)
+				.onConflictDoUpdate({
+					target: sleepData.date,
+					set: sleepRecord
+				});
+			synced++;
+		} catch (e) {
+			errors.push(`Sleep ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
+		}
+	}
 
-			// Store stress/body battery data
-			if (dayData.activity) {
-				try {
-					const stressRecord = {
-						date,
-						avgStress: dayData.activity.averageStressLevel,
-						maxStress: dayData.activity.maxStressLevel,
-						lowStressMinutes: Math.round((dayData.activity.lowStressDuration || 0) / 60),
-						mediumStressMinutes: Math.round((dayData.activity.mediumStressDuration || 0) / 60),
-						highStressMinutes: Math.round((dayData.activity.highStressDuration || 0) / 60),
-						restStressMinutes: 0,
-						bodyBatteryStart: dayData.activity.bodyBatteryLowestValue,
-						bodyBatteryEnd: dayData.activity.bodyBatteryMostRecentValue,
-						bodyBatteryMax: dayData.activity.bodyBatteryHighestValue,
-						bodyBatteryMin: dayData.activity.bodyBatteryLowestValue,
-						bodyBatteryDrained: dayData.activity.bodyBatteryDrainedValue,
-						bodyBatteryCharged: dayData.activity.bodyBatteryChargedValue,
-						rawData: JSON.stringify({
-							stress: dayData.stress,
-							bodyBattery: dayData.bodyBattery
-						})
-					};
+	// Store activity data
+	if (dayData.activity) {
+		try {
+			const activityRecord = {
+				date,
+				steps: dayData.activity.totalSteps,
+				distance: dayData.activity.totalDistanceMeters,
+				activeCalories: dayData.activity.activeKilocalories,
+				totalCalories: dayData.activity.totalKilocalories,
+				floorsClimbed: dayData.activity.floorsAscended,
+				avgHeartRate: Math.round(
+					(dayData.activity.minHeartRate + dayData.activity.maxHeartRate) / 2
+				),
+				maxHeartRate: dayData.activity.maxHeartRate,
+				restingHeartRate: dayData.activity.restingHeartRate,
+				rawData: JSON.stringify(dayData.activity)
+			};
 
-					await db
-						.insert(stressData)
-						.values(stressRecord)
-						.onConflictDoUpdate({
-							target: stressData.date,
-							set: stressRecord
-						});
-					synced++;
-				} catch (e) {
-					errors.push(`Stress ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
-				}
-			}
+			await db
+				.insert(activitySummary)
+				.values(activityRecord)
+				.onConflictDoUpdate({
+					target: activitySummary.date,
+					set: activityRecord
+				});
+			synced++;
+		} catch (e) {
+			errors.push(`Activity ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
 		}
+	}
 
-		return { success: true, synced, errors };
-	} catch (e) {
-		return {
-			success: false,
-			synced: 0,
-			errors: [e instanceof Error ? e.message : 'Unknown error']
-		};
+	// Store stress/body battery data
+	if (dayData.activity) {
+		try {
+			const stressRecord = {
+				date,
+				avgStress: dayData.activity.averageStressLevel,
+				maxStress: dayData.activity.maxStressLevel,
+				lowStressMinutes: Math.round((dayData.activity.lowStressDuration || 0) / 60),
+				mediumStressMinutes: Math.round((dayData.activity.mediumStressDuration || 0) / 60),
+				highStressMinutes: Math.round((dayData.activity.highStressDuration || 0) / 60),
+				restStressMinutes: 0,
+				bodyBatteryStart: dayData.activity.bodyBatteryLowestValue,
+				bodyBatteryEnd: dayData.activity.bodyBatteryMostRecentValue,
+				bodyBatteryMax: dayData.activity.bodyBatteryHighestValue,
+				bodyBatteryMin: dayData.activity.bodyBatteryLowestValue,
+				bodyBatteryDrained: dayData.activity.bodyBatteryDrainedValue,
+				bodyBatteryCharged: dayData.activity.bodyBatteryChargedValue,
+				rawData: JSON.stringify({
+					stress: dayData.stress,
+					bodyBattery: dayData.bodyBattery
+				})
+			};
+
+			await db
+				.insert(stressData)
+				.values(stressRecord)
+				.onConflictDoUpdate({
+					target: stressData.date,
+					set: stressRecord
+				});
+			synced++;
+		} catch (e) {
+			errors.push(`Stress ${date}: ${e instanceof Error ? e.message : 'Unknown error'}`);
+		}
 	}
+
+	return synced;
 }